@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import os
+from typing import IO, Iterator
+
+# ===================== نوشتن اتمیک فایل =====================
+# فایل در path.tmp نوشته می‌شود و فقط بعد از کامل شدن با os.replace جای فایل قبلی را می‌گیرد.
+# اگر پروسه وسط کار کشته شود (timeout ورک‌فلو) یا خطا بدهد، نسخه‌ی قبلی دست‌نخورده می‌ماند.
+
+@contextlib.contextmanager
+def atomic_open(path: str, mode: str = "w", encoding: str = "utf-8") -> Iterator[IO]:
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    f = open(tmp, mode, encoding=None if "b" in mode else encoding)
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    except BaseException:
+        f.close()
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    f.close()
+    os.replace(tmp, path)
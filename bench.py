@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import base64
+import glob
+import hashlib
+import http.server
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import psutil   # اختیاری؛ بدون آن از /proc خوانده می‌شود
+except ImportError:
+    psutil = None
+
+from fetch import body_lines
+from links import b64decode, parse_link
+
+# ===================== تنظیمات =====================
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_GLOBS = ("ss*.txt", "vless*.txt", "trojan*.txt", "ssh*.txt", "vmess*.txt")
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_MIX = {"accept": 0.6, "refuse": 0.2, "blackhole": 0.15, "delay": 0.05}
+DELAY_SECONDS = 0.5        # listener نوع delay پس از accept این مدت صبر می‌کند و بعد می‌بندد
+SOURCE_LINES = 5000        # تعداد خط هر فایل منبع شبیه‌سازی‌شده (برای موتور runner)
+SAMPLE_INTERVAL = 0.1
+
+# ===================== بنچمارک آفلاین =====================
+# همه چیز روی همین ماشین: منابع از یک سرور HTTP محلی، و اندپوینت‌ها به مزرعه‌ای از listenerهای
+# محلی بازنویسی می‌شوند (accept / refuse / blackhole / delay). هر اندپوینت یک آدرس جدا در
+# 127.0.0.0/8 دارد، پس حذف تکراری اندپوینت‌ها تعداد تست‌ها را کم نمی‌کند.
+#   python bench.py                                  → همه‌ی موتورها در 1k/10k/100k
+#   python bench.py --sizes 1000 --engines probe     → فقط یک اندازه و یک موتور
+# هر (موتور، اندازه) در پروسه‌ی جدا اجرا می‌شود تا حافظه و threadها از هم جدا اندازه‌گیری شوند.
+# توجه: زمان اتصال TCP را نمی‌توان بدون netem کند کرد؛ delay فقط پاسخ بعد از اتصال را دیر می‌کند
+# (روی مرحله‌ی handshake اثر دارد) و در تست TCP مثل accept است.
+
+# ----- مزرعه‌ی listenerها -----
+
+async def _farm(ports_out, delay: float):
+    async def close_now(reader, writer):
+        writer.close()
+
+    async def close_later(reader, writer):
+        await asyncio.sleep(delay)
+        writer.close()
+
+    accept = await asyncio.start_server(close_now, "0.0.0.0", 0, backlog=4096)
+    delayed = await asyncio.start_server(close_later, "0.0.0.0", 0, backlog=4096)
+
+    # refuse: پورت رزرو شده ولی بدون listen → RST
+    refuse = socket.socket()
+    refuse.bind(("0.0.0.0", 0))
+    # blackhole: صف accept پر است و هیچ‌وقت accept نمی‌شود → SYN دور ریخته می‌شود (timeout)
+    blackhole = socket.socket()
+    blackhole.bind(("0.0.0.0", 0))
+    blackhole.listen(0)
+    filler = socket.socket()
+    filler.connect(("127.0.0.1", blackhole.getsockname()[1]))
+
+    ports_out.put({
+        "accept": accept.sockets[0].getsockname()[1],
+        "delay": delayed.sockets[0].getsockname()[1],
+        "refuse": refuse.getsockname()[1],
+        "blackhole": blackhole.getsockname()[1],
+    })
+    await asyncio.Event().wait()
+
+def _farm_main(ports_out, delay: float):
+    asyncio.run(_farm(ports_out, delay))
+
+def start_farm(delay: float = DELAY_SECONDS) -> Tuple[multiprocessing.Process, Dict[str, int]]:
+    ports_out = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_farm_main, args=(ports_out, delay), daemon=True)
+    proc.start()
+    return proc, ports_out.get(timeout=10)
+
+# ----- سرور HTTP محلی به جای raw.githubusercontent.com -----
+
+class _SourceHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    files: Dict[str, bytes] = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.files.get(self.path.lstrip("/"))
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_http(files: Dict[str, bytes]) -> http.server.ThreadingHTTPServer:
+    handler = type("SourceHandler", (_SourceHandler,), {"files": files})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ----- ساخت کانفیگ‌ها با اندپوینت‌های مزرعه -----
+
+_AUTHORITY_RE = re.compile(r"^([A-Za-z][\w+.-]*://)([^@/?#]*@)(\[[^\]]*\]|[^:/?#]+):(\d+)")
+
+def rewrite_link(line: str, host: str, port: int) -> Optional[str]:
+    scheme = line.partition("://")[0].lower()
+    if scheme == "vmess":
+        try:
+            data = json.loads(b64decode(line[8:].partition("#")[0]))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        data["add"], data["port"] = host, str(port)
+        return "vmess://" + base64.b64encode(json.dumps(data, ensure_ascii=False).encode("utf-8")).decode()
+    if not _AUTHORITY_RE.match(line):
+        return None   # مثلاً ss قدیمی base64 بدون @
+    return _AUTHORITY_RE.sub(lambda m: f"{m.group(1)}{m.group(2)}{host}:{port}", line, count=1)
+
+def farm_address(i: int) -> str:
+    # 127.0.0.0/8 همه به loopback می‌رسند؛ هر کانفیگ یک IP جدا
+    n = i + 1
+    return f"127.{(n >> 16) & 0xFF}.{(n >> 8) & 0xFF}.{n & 0xFF}"
+
+def behavior_of(i: int, mix: Dict[str, float]) -> str:
+    point = (i * 2654435761 % 2 ** 32) / 2 ** 32   # پخش ثابت و یکنواخت
+    total = 0.0
+    for name, share in mix.items():
+        total += share
+        if point < total:
+            return name
+    return name
+
+def load_templates() -> List[str]:
+    # خطوط هر پروتکل جدا جمع و به نوبت در هم چیده می‌شوند تا اندازه‌های کوچک هم ترکیب پروتکل‌ها
+    # (و spec handshake برای vless/trojan/vmess) را داشته باشند، نه فقط خطوط ss فایل اول
+    by_scheme: Dict[str, List[str]] = {}
+    for pattern in SOURCE_GLOBS:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            with open(path, "rb") as f:
+                for line in body_lines(f.read()):
+                    rec = parse_link(line)
+                    if rec and rewrite_link(line, "127.0.0.1", 1):
+                        by_scheme.setdefault(rec.scheme, []).append(line)
+    templates = [line for group in itertools.zip_longest(*by_scheme.values()) for line in group if line]
+    if not templates:
+        raise SystemExit("no usable config lines found in the repo's source files")
+    return templates
+
+def build_configs(size: int, ports: Dict[str, int], mix: Dict[str, float]) -> Tuple[List[str], Dict[str, int]]:
+    templates = load_templates()
+    lines, expected = [], {}
+    for i in range(size):
+        behavior = behavior_of(i, mix)
+        expected[behavior] = expected.get(behavior, 0) + 1
+        lines.append(rewrite_link(templates[i % len(templates)], farm_address(i), ports[behavior]))
+    return lines, expected
+
+# ----- نمونه‌برداری منابع پروسه -----
+
+def _fd_count() -> int:
+    if psutil is not None:
+        return psutil.Process().num_fds()
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+def _rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return -1.0
+
+class Sampler(threading.Thread):
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = {"threads": 0, "fds": 0, "rss_mb": 0.0}
+        self.stopped = threading.Event()
+
+    def sample(self):
+        # خود sampler یک thread است؛ از شمارش کم می‌شود
+        self.peak["threads"] = max(self.peak["threads"], threading.active_count() - 1)
+        self.peak["fds"] = max(self.peak["fds"], _fd_count())
+        self.peak["rss_mb"] = max(self.peak["rss_mb"], round(_rss_mb(), 1))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> Dict:
+        self.stopped.set()
+        self.join()
+        self.sample()
+        return self.peak
+
+# ----- موتورها -----
+
+def engine_threads(lines: List[str], args) -> int:
+    # مسیر قبلی cl.py/cl2.py برای مقایسه‌ی قبل/بعد: یک thread برای هر خط، regex روی خط unquote‌شده
+    # و socket.create_connection مسدودکننده (کپی process_configs/tcp_test نسخه‌ی پایه)
+    import urllib.parse
+
+    def tcp_test(host: str, port: int, timeout: float) -> bool:
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except Exception:
+            return False
+
+    valid = []
+    lock = threading.Lock()
+
+    def worker(line: str):
+        cfg = urllib.parse.unquote(line.strip())
+        if not cfg.startswith(("vmess://", "vless://", "trojan://", "hy2://", "hysteria2://", "ss://",
+                               "socks://", "wireguard://", "ssh://")):
+            return
+        m = re.search(r"@([^:]+):(\d+)", cfg)
+        host, port = (m.group(1), int(m.group(2))) if m else ("", 22)
+        if not host or tcp_test(host, port, args.timeout):
+            with lock:
+                valid.append(line)
+
+    threads = [threading.Thread(target=worker, args=(line,)) for line in lines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # مثل نسخه‌ی پایه، خطوط بدون @ (مثلاً vmess) بدون تست قبول می‌شوند
+    return len(dict.fromkeys(valid))
+
+def engine_probe(lines: List[str], args) -> int:
+    # موتور تست TCP به تنهایی (probe_endpoints)
+    from probe import probe_endpoints
+    jobs = ((i, rec.host, rec.port) for i, rec in enumerate(map(parse_link, lines)) if rec)
+    results = probe_endpoints(jobs, concurrency=args.concurrency, timeout=args.timeout, deadline=10 ** 6)
+    return sum(1 for r in results.values() if r is not None)
+
+def engine_process(lines: List[str], args) -> int:
+    # API لیستی (process_configs در cl.py/cl2.py): پارس + حذف تکراری + تست + مرتب‌سازی
+    from runner import process_links
+    return len(process_links(lines, precise_test=True, concurrency=args.concurrency, timeout=args.timeout))
+
+def engine_runner(lines: List[str], args) -> int:
+    # کل مسیر: دانلود از HTTP محلی، پارس، normal، تست، final
+    from runner import run
+    files = {f"src{n}.txt": "\n".join(lines[start:start + SOURCE_LINES]).encode("utf-8")
+             for n, start in enumerate(range(0, len(lines), SOURCE_LINES))}
+    server = start_http(files)
+    base = f"http://127.0.0.1:{server.server_port}/"
+    profile = {"name": "bench", "kind": "links", "sources": [base + name for name in files],
+               "normal": "normal.txt", "final": "final.txt", "header": ""}
+    run([profile], {"concurrency": args.concurrency, "probe_timeout": args.timeout, "run_deadline": 10 ** 6, "delta": False,
+                    "handshake_test": args.handshake, "checkpoint_interval": 0, "report": ""})
+    server.shutdown()
+    with open("final.txt", "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+ENGINES: Dict[str, Callable[[List[str], argparse.Namespace], int]] = {
+    "threads": engine_threads,
+    "probe": engine_probe,
+    "process": engine_process,
+    "runner": engine_runner,
+}
+
+# ----- اجرا -----
+
+def run_child(args) -> Dict:
+    lines, expected = build_configs(args.child_size, json.loads(args.ports), args.mix)
+    os.chdir(tempfile.mkdtemp(prefix="bench-"))   # کش‌ها و خروجی‌ها در پوشه‌ی موقت
+    sampler = Sampler()
+    sampler.start()
+    start = time.perf_counter()
+    alive = ENGINES[args.child_engine](lines, args)
+    seconds = time.perf_counter() - start
+    peak = sampler.stop()
+    return {
+        "engine": args.child_engine,
+        "configs": len(lines),
+        "seconds": round(seconds, 3),
+        "configs_per_sec": round(len(lines) / seconds, 1) if seconds else None,
+        "alive": alive,
+        "expected_alive": expected.get("accept", 0) + expected.get("delay", 0),
+        "peak_threads": peak["threads"],
+        "peak_fds": peak["fds"],
+        "peak_rss_mb": peak["rss_mb"],
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, share = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown behavior {name!r}")
+        mix[name] = float(share)
+    total = sum(mix.values())
+    return {k: v / total for k, v in mix.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a local endpoint farm")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="e.g. accept=0.6,refuse=0.2,blackhole=0.15,delay=0.05")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--handshake", action="store_true", help="include the handshake stage (runner engine)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="show engine output")
+    parser.add_argument("--child-engine", help=argparse.SUPPRESS)
+    parser.add_argument("--child-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--ports", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_engine:
+        print("BENCH " + json.dumps(run_child(args)), flush=True)
+        return
+
+    farm, ports = start_farm()
+    print(f"[*] Farm listening: {ports}")
+    rows = []
+    mix = ",".join(f"{k}={v}" for k, v in args.mix.items())
+    try:
+        for size in map(int, args.sizes.split(",")):
+            for engine in args.engines.split(","):
+                if engine not in ENGINES:
+                    raise SystemExit(f"unknown engine {engine!r}; choose from {', '.join(ENGINES)}")
+                cmd = [sys.executable, os.path.abspath(__file__), "--child-engine", engine,
+                       "--child-size", str(size), "--ports", json.dumps(ports), "--mix", mix,
+                       "--concurrency", str(args.concurrency), "--timeout", str(args.timeout)]
+                if args.handshake:
+                    cmd.append("--handshake")
+                proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+                if args.verbose:
+                    print(proc.stdout + proc.stderr)
+                row = next((json.loads(line[6:]) for line in proc.stdout.splitlines()
+                            if line.startswith("BENCH ")), None)
+                if row is None:
+                    print(f"[❌] {engine} @ {size} failed:\n{proc.stderr[-2000:]}")
+                    continue
+                rows.append(row)
+                print(f"[ℹ️] {engine:>8} {size:>7} configs: {row['seconds']:>8.2f}s "
+                      f"({row['configs_per_sec']}/s), alive {row['alive']}/{row['expected_alive']}, "
+                      f"threads {row['peak_threads']}, fds {row['peak_fds']}, rss {row['peak_rss_mb']} MB")
+    finally:
+        farm.terminate()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[*] Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
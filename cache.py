@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+from atomic import atomic_open
+
+# ===================== تنظیمات =====================
+CACHE_PATH = os.path.join(".cache", "probe_cache.json")
+
+ALIVE_TTL = 2 * 3600        # اعتبار نتیجه‌ی سالم
+DEAD_TTL = 30 * 60          # اعتبار نتیجه‌ی خراب (پایه‌ی backoff)
+MAX_BACKOFF = 24 * 3600     # سقف backoff برای اندپوینت‌هایی که مدام خراب‌اند
+MAX_ENTRIES = 50000         # حداکثر اندازه‌ی کش؛ قدیمی‌ترها حذف می‌شوند
+TTL_SPREAD = 0.5            # پخش انقضا: هر اندپوینت بین (1 - spread) تا 1 برابر TTL معتبر است
+
+Endpoint = Tuple[str, int]
+
+# ===================== کش نتایج تست =====================
+
+def _key(endpoint: Endpoint) -> str:
+    host, port = endpoint
+    return f"{host}:{port}"
+
+class ProbeCache:
+    def __init__(self, path: str = CACHE_PATH, alive_ttl: float = ALIVE_TTL, dead_ttl: float = DEAD_TTL,
+                 max_backoff: float = MAX_BACKOFF, max_entries: int = MAX_ENTRIES, spread: float = TTL_SPREAD):
+        self.path = path
+        self.alive_ttl = alive_ttl
+        self.dead_ttl = dead_ttl
+        self.max_backoff = max_backoff
+        self.max_entries = max_entries
+        self.spread = spread
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> "ProbeCache":
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.entries = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[⚠️] Cannot read probe cache {self.path}: {e}")
+        return self
+
+    def save(self):
+        self._evict()
+        try:
+            with atomic_open(self.path) as f:
+                json.dump(self.entries, f, separators=(",", ":"))
+        except Exception as e:
+            print(f"[⚠️] Cannot write probe cache {self.path}: {e}")
+
+    def ttl(self, entry: Dict) -> float:
+        if entry.get("ok"):
+            return self.alive_ttl
+        # backoff نمایی: هر شکست پیاپی مهلت تست بعدی را دو برابر می‌کند
+        fails = max(int(entry.get("fails", 1)), 1)
+        return min(self.dead_ttl * 2 ** (fails - 1), self.max_backoff)
+
+    def _spread(self, key: str) -> float:
+        # ضریب ثابت برای هر اندپوینت؛ اندپوینت‌هایی که با هم تست شده‌اند با هم منقضی نمی‌شوند
+        # و بازبینی آن‌ها در چند اجرای پشت سر هم پخش می‌شود
+        return 1.0 - self.spread * (zlib.crc32(key.encode("utf-8")) / 0xFFFFFFFF)
+
+    def peek(self, endpoint: Endpoint) -> Optional[Dict]:
+        # آخرین نتیجه، تازه یا کهنه (بدون شمارش hit/miss)
+        return self.entries.get(_key(endpoint))
+
+    def expiry(self, endpoint: Endpoint) -> float:
+        # زمانی که نتیجه کهنه می‌شود؛ ۰ برای اندپوینتی که هیچ‌وقت تست نشده
+        key = _key(endpoint)
+        entry = self.entries.get(key)
+        if not entry:
+            return 0.0
+        return entry.get("ts", 0) + self.ttl(entry) * self._spread(key)
+
+    def get(self, endpoint: Endpoint, now: Optional[float] = None) -> Optional[Dict]:
+        key = _key(endpoint)
+        entry = self.entries.get(key)
+        now = time.time() if now is None else now
+        if entry and now - entry.get("ts", 0) < self.ttl(entry) * self._spread(key):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, endpoint: Endpoint, latency: Optional[float], jitter: float = 0.0, loss: float = 0.0,
+            now: Optional[float] = None):
+        key = _key(endpoint)
+        prev = self.entries.get(key, {})
+        ok = latency is not None
+        self.entries[key] = {
+            "ok": ok,
+            "latency": round(latency, 1) if ok else None,
+            "jitter": round(jitter, 1) if ok else None,
+            "loss": round(loss, 2) if ok else None,
+            "ts": time.time() if now is None else now,
+            "fails": 0 if ok else int(prev.get("fails", 0)) + 1,
+        }
+
+    def _evict(self):
+        extra = len(self.entries) - self.max_entries
+        if extra > 0:
+            oldest = sorted(self.entries, key=lambda k: self.entries[k].get("ts", 0))[:extra]
+            for key in oldest:
+                del self.entries[key]
@@ -1,176 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
-import json
-import threading
-import time
-import requests
-import base64
-import urllib.parse
-import socket
-from typing import List
+# تنظیمات این خروجی (منابع، نام فایل‌ها، هدر) در پروفایل "cl2" فایل profiles.json است؛
+# اجرای همه‌ی پروفایل‌ها با هم: python runner.py
 
-# ===================== تنظیمات =====================
-TEXT_PATH = "normal2.txt"
-FIN_PATH = "final2.txt"
+import argparse
+from typing import Optional
 
-LINK_PATH = [
-    
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan10.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan20.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan30.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan40.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan50.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan60.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan70.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan80.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/trojan90.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless10.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless20.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless30.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless40.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless50.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless60.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless70.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless80.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/vless90.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss10.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss20.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss30.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss40.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss50.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss60.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss70.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss80.txt",
-"https://raw.githubusercontent.com/tepo80/tepo18/main/ss90.txt"
+from runner import load_profiles, process_links as process_configs, run
 
-]
+PROFILE = "cl2"
 
-FILE_HEADER_TEXT = "//profile-title: base64:2YfZhduM2LTZhyDZgdi52KfZhCDwn5iO8J+YjvCfmI4gaGFtZWRwNzE="
-
-# ===================== توابع =====================
-
-def fetch_link(url: str) -> List[str]:
-    try:
-        r = requests.get(url, timeout=15)
-        if r.status_code == 200:
-            lines = r.text.splitlines()
-            return [l.strip() for l in lines if l.strip()]
-    except Exception as e:
-        print(f"[⚠️] Cannot fetch {url}: {e}")
-    return []
-
-def is_valid_config(line: str) -> bool:
-    line = line.strip()
-    if not line or len(line) < 5:
-        return False
-    lower = line.lower()
-    if "pin=0" in lower or "pin=red" in lower or "pin=قرمز" in lower:
-        return False
-    return True
-
-def parse_config_line(line: str):
-    try:
-        line = urllib.parse.unquote(line.strip())
-        for p in ["ssh", "vmess", "vless", "trojan", "hy2", "hysteria2", "ss", "socks", "wireguard"]:
-            if line.startswith(p + "://"):
-                return line
-    except:
-        pass
-    return None
-
-def tcp_test(host: str, port: int, timeout=3) -> bool:
-    try:
-        with socket.create_connection((host, port), timeout=timeout):
-            return True
-    except:
-        return False
-
-def process_configs(lines: List[str], precise_test=False) -> List[str]:
-    valid_configs = []
-    lock = threading.Lock()
-
-    def worker(line):
-        cfg = parse_config_line(line)
-        passed = False
-
-        if cfg:
-            try:
-                import re
-                m = re.search(r"@([^:]+):(\d+)", cfg)
-                host, port = (m.group(1), int(m.group(2))) if m else ("", 22)
-
-                if precise_test and host:
-                    passed = tcp_test(host, port)
-                else:
-                    passed = True
-            except:
-                passed = False
-
-        if passed and is_valid_config(line):
-            with lock:
-                valid_configs.append(line)
-
-    threads = []
-    for line in lines:
-        t = threading.Thread(target=worker, args=(line,))
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
-
-    # حذف تکراری‌ها
-    final_list = list(dict.fromkeys(valid_configs))
-    return final_list
-
-def save_outputs(lines: List[str]):
-    try:
-        # پاکسازی فایل‌ها قبل از نوشتن
-        for path in [TEXT_PATH, FIN_PATH]:
-            with open(path, "w", encoding="utf-8") as f:
-                f.write("")
-
-        # مرحله ۱: نرمال
-        normal_lines = lines
-        with open(TEXT_PATH, "w", encoding="utf-8") as f:
-            f.write("\n".join([FILE_HEADER_TEXT] + normal_lines))
-        print(f"[ℹ️] Stage 1 complete → {len(normal_lines)} configs saved to '{TEXT_PATH}'")
-
-        # مرحله ۲: نهایی با تست TCP
-        final_lines = process_configs(normal_lines, precise_test=True)
-        with open(FIN_PATH, "w", encoding="utf-8") as f:
-            f.write("\n".join(final_lines))
-        print(f"[ℹ️] Stage 2 complete → {len(final_lines)} configs saved to '{FIN_PATH}'")
-
-        # گزارش نهایی
-        print(f"[✅] All tasks completed successfully.")
-        print(f"  ├─ Normal configs: {len(normal_lines)} saved to '{TEXT_PATH}'")
-        print(f"  └─ Final configs : {len(final_lines)} saved to '{FIN_PATH}'")
-
-    except Exception as e:
-        print(f"[❌] Error while saving outputs: {e}")
-
-def update_subs():
-    all_lines = []
-
-    for url in LINK_PATH:
-        fetched = fetch_link(url)
-        if not fetched:
-            print(f"[⚠️] Empty or failed to fetch: {url}")
-        else:
-            all_lines.extend(fetched)
-
-    print(f"[*] Total lines fetched from all sources: {len(all_lines)}")
-    all_lines = process_configs(all_lines)
-    save_outputs(all_lines)
+def update_subs(snapshot: Optional[str] = None, deadline: Optional[float] = None):
+    # snapshot: شناسه‌ی یک اجرای قبلی (یا "latest") برای اجرای بدون دانلود از snapshot منابع
+    # deadline: مهلت تست (ثانیه از شروع پروسه)، کمتر از timeout ورک‌فلو
+    settings, profiles = load_profiles(names=[PROFILE])
+    if deadline:
+        settings["run_deadline"] = deadline
+    run(profiles, settings, replay=snapshot)
 
 # ===================== اجرای دستی =====================
 if __name__ == "__main__":
-    print(f"[*] Starting manual update process → outputs: '{TEXT_PATH}', '{FIN_PATH}'")
-    update_subs()
-    print(f"[*] Finished. Results written to '{TEXT_PATH}' and '{FIN_PATH}'.")
+    parser = argparse.ArgumentParser(description=f"Update profile {PROFILE}")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS", help="stop probing SECONDS after start")
+    args = parser.parse_args()
+    print("[*] Starting manual update process → outputs: 'normal2.txt', 'final2.txt'")
+    update_subs(deadline=args.deadline)
+    print("[*] Finished. Results written to 'normal2.txt' and 'final2.txt'.")
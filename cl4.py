@@ -1,124 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
-import json
-import threading
-import time
-import socket
-import urllib.request
-from typing import List, Dict
-
-# ===================== تنظیمات =====================
-NORMAL_JSON = "normal2.json"
-FINAL_JSON = "final2.json"
-
-LINKS_PATH = [
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip10.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip20.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip30.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip40.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip50.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip60.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip70.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip80.json",
-    "https://raw.githubusercontent.com/tepo80/tepo18/main/vip90.json"
-]
-
-MAX_THREADS = 20
-TCP_TIMEOUT = 3.0
-
-# ===================== توابع =====================
-def fetch_json(url: str) -> List[Dict]:
-    try:
-        with urllib.request.urlopen(url, timeout=15) as resp:
-            data = json.loads(resp.read().decode())
-        return data if isinstance(data, list) else []
-    except Exception as e:
-        print(f"[⚠️] Cannot fetch {url}: {e}")
-        return []
-
-def validate_config(cfg: Dict) -> bool:
-    return bool(cfg and "remarks" in cfg and "outbounds" in cfg)
-
-def tcp_test(address: str, port: int, timeout=TCP_TIMEOUT) -> bool:
-    try:
-        with socket.create_connection((address, port), timeout=timeout):
-            return True
-    except:
-        return False
-
-def process_configs(configs: List[Dict], precise_test=False) -> List[Dict]:
-    results = []
-    lock = threading.Lock()
-    threads = []
+# تنظیمات این خروجی (منابع، نام فایل‌ها، خروجی فشرده) در پروفایل "cl4" فایل profiles.json است؛
+# اجرای همه‌ی پروفایل‌ها با هم: python runner.py
 
-    def worker(cfg):
-        if "outbounds" in cfg:
-            try:
-                vnext = cfg["outbounds"][0]["settings"]["vnext"][0]
-                host = vnext.get("address")
-                port = vnext.get("port", 443)
-                if precise_test and host:
-                    if tcp_test(host, port):
-                        with lock:
-                            results.append(cfg)
-                else:
-                    with lock:
-                        results.append(cfg)
-            except:
-                pass
-
-    for cfg in configs:
-        t = threading.Thread(target=worker, args=(cfg,))
-        threads.append(t)
-        t.start()
-        if len(threads) >= MAX_THREADS:
-            for th in threads:
-                th.join()
-            threads = []
-
-    for t in threads:
-        t.join()
-
-    # حذف تکراری با استفاده از remarks
-    unique = {}
-    for cfg in results:
-        key = cfg.get("remarks")
-        if key not in unique:
-            unique[key] = cfg
-
-    return list(unique.values())
-
-def save_json_files(normal_list: List[Dict], final_list: List[Dict]):
-    os.makedirs(os.path.dirname(os.path.abspath(NORMAL_JSON)), exist_ok=True)
-
-    with open(NORMAL_JSON, "w", encoding="utf-8") as f:
-        json.dump(normal_list, f, ensure_ascii=False, indent=4)
-    with open(FINAL_JSON, "w", encoding="utf-8") as f:
-        json.dump(final_list, f, ensure_ascii=False, indent=4)
+import argparse
+import time
+from typing import Optional
 
-    print(f"[ℹ️] Normal configs: {len(normal_list)} saved to {NORMAL_JSON}")
-    print(f"[ℹ️] Final configs (after TCP test): {len(final_list)} saved to {FINAL_JSON}")
-    print(f"[✅] Update complete. Normal2.json and Final2.json are ready.")
+from runner import load_profiles, process_xray as process_configs, run
 
-def update_subs():
-    all_configs = []
-    for url in LINKS_PATH:
-        data = fetch_json(url)
-        for cfg in data:
-            if validate_config(cfg):
-                all_configs.append(cfg)
+PROFILE = "cl4"
 
-    print(f"[*] Total configs fetched from sources: {len(all_configs)}")
-    normal_list = all_configs
-    final_list = process_configs(normal_list, precise_test=True)
-    save_json_files(normal_list, final_list)
+def update_subs(snapshot: Optional[str] = None, deadline: Optional[float] = None):
+    # snapshot: شناسه‌ی یک اجرای قبلی (یا "latest") برای اجرای بدون دانلود از snapshot منابع
+    # deadline: مهلت تست (ثانیه از شروع پروسه)، کمتر از timeout ورک‌فلو
+    settings, profiles = load_profiles(names=[PROFILE])
+    if deadline:
+        settings["run_deadline"] = deadline
+    run(profiles, settings, replay=snapshot)
 
 # ========================== اجرا ==========================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Update profile {PROFILE}")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS", help="stop probing SECONDS after start")
+    args = parser.parse_args()
     print("[*] Starting JSON subscription update...")
     start_time = time.time()
-    update_subs()
+    update_subs(deadline=args.deadline)
     print(f"[*] Done. Time elapsed: {time.time() - start_time:.2f}s")
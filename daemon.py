@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+
+from cache import ProbeCache
+from fetch import iter_sources
+from handshake import HANDSHAKE_TIMEOUT, HandshakeSpec, handshake_probe, xray_spec
+from probe import ProbeResult, canonical_endpoint, measure
+from runner import PROFILES_PATH, line_spec, load_profiles, parse_links, parse_xray
+
+# ===================== تنظیمات =====================
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8080
+PROBE_RATE = 20.0          # تعداد تست اندپوینت در ثانیه (بار ثابت به جای موج ساعتی)
+SOURCE_REFRESH = 3600      # هر چند ثانیه منابع دوباره دانلود و پارس شوند
+REBUILD_INTERVAL = 10      # هر چند ثانیه (در صورت تغییر) لیست‌های final دوباره ساخته شوند
+CACHE_SAVE_INTERVAL = 300  # هر چند ثانیه جدول سلامت روی دیسک (کش تست) نوشته شود
+
+Endpoint = Tuple[str, int]
+Entry = Tuple[object, Optional[Endpoint], Optional[HandshakeSpec]]   # (خط یا کانفیگ، اندپوینت، spec)
+
+# ===================== سرویس دائمی =====================
+# به جای cron ساعتی، یک پروسه‌ی ماندگار مجموعه‌ی کانفیگ‌های پارس‌شده و جدول سلامت اندپوینت‌ها
+# (همان کش تست cache.py) را در حافظه نگه می‌دارد. اندپوینت‌ها با نرخ ثابت و به ترتیب کهنگی
+# (زودترین انقضا در کش، با backoff برای خراب‌ها) دوباره تست می‌شوند؛ بعد از اتصال TCP موفق همان
+# handshake مرحله‌ی دوم runner (TLS/WebSocket/gRPC) برای کانفیگ‌های آن اندپوینت هم تکرار می‌شود.
+# final هر پروفایل با ETag روی HTTP محلی سرو می‌شود:
+#   GET /            فهرست پروفایل‌ها و وضعیت
+#   GET /status      آمار تست و منابع
+#   GET /cl          final پروفایل cl (یا با نام فایلش: /final.txt)
+
+class Daemon:
+    def __init__(self, profiles: List[Dict], settings: Dict, rate: float = PROBE_RATE,
+                 refresh: float = SOURCE_REFRESH):
+        self.profiles = profiles
+        self.settings = settings
+        self.rate = max(rate, 0.1)
+        self.refresh = refresh
+        self.cache = ProbeCache().load()
+        # پروفایل → [(خط یا کانفیگ، اندپوینت یا None، spec handshake یا None)]
+        self.entries: Dict[str, List[Entry]] = {}
+        self.endpoints: Set[Endpoint] = set()
+        self.specs: Dict[Endpoint, Set[HandshakeSpec]] = {}
+        self.handshakes: Dict[Tuple[Endpoint, HandshakeSpec], bool] = {}
+        self.heap: List[Tuple[float, Endpoint]] = []
+        self.due: Dict[Endpoint, float] = {}
+        self.inflight: Set[asyncio.Future] = set()
+        self.bodies: Dict[str, Tuple[bytes, str, str]] = {}   # پروفایل → (بدنه، ETag، Content-Type)
+        self.routes: Dict[str, str] = {}
+        for p in profiles:
+            self.routes["/" + p["name"]] = p["name"]
+            self.routes["/" + p["final"].rsplit("/", 1)[-1]] = p["name"]
+        self.dirty = True
+        self.stats = {"started": time.time(), "probes": 0, "alive": 0, "refreshed": None, "sources": 0}
+
+    # ---------- مجموعه‌ی کانفیگ‌ها ----------
+
+    def load_sources(self) -> Dict[str, List[Entry]]:
+        # همان مرحله‌ی ۱ runner (parse_links/parse_xray): هر منبع یک بار دانلود و برای همه‌ی
+        # پروفایل‌هایش پارس می‌شود؛ spec handshake هم همین‌جا (بیرون از event loop) ساخته می‌شود
+        users: Dict[str, Dict[str, List[str]]] = {}
+        for p in self.profiles:
+            for url in p["sources"]:
+                users.setdefault(url, {}).setdefault(p.get("kind", "links"), []).append(p["name"])
+        entries: Dict[str, list] = {p["name"]: [] for p in self.profiles}
+        seen: Dict[str, set] = {p["name"]: set() for p in self.profiles}
+        for url, body in iter_sources(list(users)):
+            for kind, names in users[url].items():
+                if kind == "links":
+                    for line, key, endpoint in parse_links(body)[1]:
+                        targets = [name for name in names if key not in seen[name]]
+                        if not targets:
+                            continue
+                        spec = line_spec(line) if endpoint else None
+                        for name in targets:
+                            seen[name].add(key)
+                            entries[name].append((line, endpoint, spec))
+                    continue
+                for cfg, endpoint in parse_xray(url, body):
+                    endpoint = endpoint if endpoint and endpoint[0] else None
+                    spec = xray_spec(cfg) if endpoint else None
+                    for name in names:
+                        entries[name].append((cfg, endpoint, spec))
+        self.stats["sources"] = len(users)
+        return entries
+
+    def apply(self, entries: Dict[str, List[Entry]]):
+        endpoints: Set[Endpoint] = set()
+        specs: Dict[Endpoint, Set[HandshakeSpec]] = {}
+        for name, items in entries.items():
+            canonical = []
+            for payload, endpoint, spec in items:
+                if endpoint is not None:
+                    try:
+                        endpoint = canonical_endpoint(*endpoint)
+                    except (TypeError, ValueError):
+                        endpoint = None
+                if endpoint is not None:
+                    endpoints.add(endpoint)
+                    if spec is not None:
+                        specs.setdefault(endpoint, set()).add(spec)
+                canonical.append((payload, endpoint, spec))
+            entries[name] = canonical
+        self.entries = entries
+        self.specs = specs
+        # نتایج handshake کانفیگ‌هایی که دیگر در منابع نیستند دور ریخته می‌شوند
+        self.handshakes = {k: ok for k, ok in self.handshakes.items() if k[1] in specs.get(k[0], ())}
+        added = endpoints - self.endpoints
+        self.endpoints = endpoints
+        for ep in added:
+            if ep not in self.due:
+                self.schedule(ep)
+        self.dirty = True
+        self.stats["refreshed"] = time.time()
+        configs = sum(len(items) for items in entries.values())
+        print(f"[ℹ️] Config set: {configs} configs, {len(endpoints)} endpoints ({len(added)} new)")
+
+    # ---------- جدول سلامت و ترتیب تست ----------
+
+    def schedule(self, ep: Endpoint):
+        # ترتیب تست = زمان کهنه شدن نتیجه در کش (با backoff و پخش TTL)؛ تست‌نشده‌ها اول
+        due = self.due[ep] = self.cache.expiry(ep)
+        heapq.heappush(self.heap, (due, ep))
+
+    def next_endpoint(self) -> Optional[Endpoint]:
+        while self.heap:
+            due, ep = heapq.heappop(self.heap)
+            # اندپوینت حذف‌شده از منابع یا ورودی قدیمی heap کنار گذاشته می‌شود
+            if ep in self.endpoints and self.due.get(ep) == due:
+                del self.due[ep]
+                return ep
+            if ep not in self.endpoints:
+                self.due.pop(ep, None)
+        return None
+
+    def result_of(self, ep: Optional[Endpoint], spec: Optional[HandshakeSpec] = None) -> Optional[ProbeResult]:
+        entry = self.cache.peek(ep) if ep else None
+        if not entry or not entry.get("ok"):
+            return None
+        # مثل runner، کانفیگی که handshakeش هنوز تست نشده قبول می‌شود
+        if spec is not None and not self.handshakes.get((ep, spec), True):
+            return None
+        return ProbeResult(entry["latency"], entry.get("jitter") or 0.0, entry.get("loss") or 0.0)
+
+    async def probe_one(self, ep: Endpoint, slots: asyncio.Semaphore):
+        try:
+            result = await measure(*ep, timeout=self.settings["probe_timeout"])
+            if result is None:
+                self.cache.put(ep, None)
+            else:
+                self.cache.put(ep, result.latency, result.jitter, result.loss)
+                if self.settings["handshake_test"]:
+                    # مرحله‌ی دوم: handshake واقعی برای هر spec متفاوت کانفیگ‌های این اندپوینت
+                    specs = list(self.specs.get(ep, ()))
+                    oks = await asyncio.gather(*(handshake_probe(*ep, spec, timeout=HANDSHAKE_TIMEOUT)
+                                                 for spec in specs))
+                    for spec, ok in zip(specs, oks):
+                        self.handshakes[(ep, spec)] = ok
+            self.stats["probes"] += 1
+            self.dirty = True
+        finally:
+            slots.release()
+            if ep in self.endpoints:
+                self.schedule(ep)
+
+    async def prober(self):
+        # بار ثابت: هر 1/rate ثانیه کهنه‌ترین اندپوینت تست می‌شود (حداکثر concurrency تست هم‌زمان)
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(max(1, self.settings["concurrency"]))
+        interval = 1.0 / self.rate
+        next_at = loop.time()
+        while True:
+            next_at = max(next_at + interval, loop.time() - interval)
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            await slots.acquire()
+            ep = self.next_endpoint()
+            if ep is None:
+                slots.release()
+                continue
+            task = asyncio.ensure_future(self.probe_one(ep, slots))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+    # ---------- ساخت و سرو final ----------
+
+    def rebuild(self):
+        # در thread جدا اجرا می‌شود (rebuilder)؛ فقط از روی وضعیت فعلی می‌خواند
+        alive_total = 0
+        bodies = {}
+        for p in self.profiles:
+            name = p["name"]
+            items = self.entries.get(name, [])
+            scored = []
+            untested = []
+            for n, (payload, ep, spec) in enumerate(items):
+                result = self.result_of(ep, spec)
+                if result is not None:
+                    scored.append((result.score(), n, payload))
+                elif ep is None and p.get("kind", "links") == "xray":
+                    untested.append(payload)
+            scored.sort(key=lambda t: t[:2])
+            alive_total += len(scored)
+            ranked = [payload for _, _, payload in scored]
+            if p.get("kind", "links") == "links":
+                body = "\n".join(ranked).encode("utf-8")
+                ctype = "text/plain; charset=utf-8"
+            else:
+                # همان حذف تکراری با remarks در final اجرای runner
+                seen_remarks = set()
+                final_list = []
+                for cfg in ranked + untested:
+                    if cfg.get("remarks") not in seen_remarks:
+                        seen_remarks.add(cfg.get("remarks"))
+                        final_list.append(cfg)
+                body = json.dumps(final_list, ensure_ascii=False, indent=4).encode("utf-8")
+                ctype = "application/json; charset=utf-8"
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            bodies[name] = (body, etag, ctype)
+        self.bodies = bodies
+        self.stats["alive"] = alive_total
+
+    async def rebuilder(self):
+        # ساخت بدنه‌ها (json.dumps لیست‌های xray) در executor تا تست‌ها و سرو متوقف نشوند
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(REBUILD_INTERVAL)
+            if self.dirty:
+                self.dirty = False
+                await loop.run_in_executor(None, self.rebuild)
+
+    async def refresher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh)
+            try:
+                self.apply(await loop.run_in_executor(None, self.load_sources))
+            except Exception as e:
+                print(f"[⚠️] Source refresh failed: {e}")
+
+    async def saver(self):
+        while True:
+            await asyncio.sleep(CACHE_SAVE_INTERVAL)
+            self.cache.save()
+            s = self.stats
+            print(f"[ℹ️] Daemon: {s['probes']} probes, {s['alive']} alive configs, "
+                  f"{len(self.endpoints)} endpoints, {len(self.inflight)} in flight")
+
+    def status(self) -> Dict[str, object]:
+        # روی thread سرور HTTP اجرا می‌شود؛ probe_one هم‌زمان در event loop به handshakes اضافه می‌کند
+        handshakes = list(self.handshakes.values())
+        return {
+            **self.stats,
+            "endpoints": len(self.endpoints),
+            "in_flight": len(self.inflight),
+            "handshakes": {"tested": len(handshakes), "failed": handshakes.count(False)},
+            "rate": self.rate,
+            "profiles": {name: {"configs": len(items), "etag": self.bodies.get(name, (b"", ""))[1]}
+                         for name, items in self.entries.items()},
+        }
+
+    def handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_body(self, body: bytes, ctype: str, etag: Optional[str] = None):
+                if etag and etag in (self.headers.get("If-None-Match") or ""):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-cache")
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0].rstrip("/") or "/"
+                if path in ("/", "/status"):
+                    data = daemon.status()
+                    if path == "/":
+                        data = {"profiles": sorted(daemon.routes), "status": data}
+                    self.send_body(json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"),
+                                   "application/json; charset=utf-8")
+                    return
+                name = daemon.routes.get(path)
+                if name is None or name not in daemon.bodies:
+                    self.send_error(404)
+                    return
+                body, etag, ctype = daemon.bodies[name]
+                self.send_body(body, ctype, etag)
+
+            do_HEAD = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    async def run(self, host: str = DAEMON_HOST, port: int = DAEMON_PORT):
+        loop = asyncio.get_running_loop()
+        # با نتایج کش سرو شروع می‌شود؛ تست‌ها به تدریج جدول سلامت را تازه می‌کنند
+        self.apply(await loop.run_in_executor(None, self.load_sources))
+        self.dirty = False
+        await loop.run_in_executor(None, self.rebuild)
+        server = ThreadingHTTPServer((host, port), self.handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[✅] Serving {', '.join(p['name'] for p in self.profiles)} on http://{host}:{server.server_port}/ "
+              f"({self.rate:g} probes/s)")
+        tasks = asyncio.gather(self.prober(), self.rebuilder(), self.refresher(), self.saver())
+        try:
+            # SIGTERM (systemd/docker stop) هم مثل Ctrl+C کش را ذخیره و خارج می‌شود
+            loop.add_signal_handler(signal.SIGTERM, tasks.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+        try:
+            await tasks
+        except asyncio.CancelledError:
+            print("[*] Daemon stopped.")
+        finally:
+            server.shutdown()
+            self.cache.save()
+
+# ========================== اجرا ==========================
+if __name__ == "__main__":
+    # python daemon.py                  → همه‌ی پروفایل‌ها روی http://127.0.0.1:8080/
+    # python daemon.py cl --rate 5      → فقط پروفایل cl با ۵ تست در ثانیه
+    parser = argparse.ArgumentParser(description="Resident subscription service with rolling re-validation")
+    parser.add_argument("profiles", nargs="*", help="profile names from profiles.json (default: all)")
+    parser.add_argument("--profiles-file", default=PROFILES_PATH)
+    parser.add_argument("--host", default=DAEMON_HOST)
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    parser.add_argument("--rate", type=float, default=PROBE_RATE, help="endpoint probes per second")
+    parser.add_argument("--refresh", type=float, default=SOURCE_REFRESH, help="seconds between source refreshes")
+    args = parser.parse_args()
+
+    settings, profiles = load_profiles(args.profiles_file, args.profiles)
+    print(f"[*] Starting daemon → profiles: {', '.join(p['name'] for p in profiles)}")
+    try:
+        asyncio.run(Daemon(profiles, settings, args.rate, args.refresh).run(args.host, args.port))
+    except KeyboardInterrupt:
+        print("[*] Daemon stopped.")
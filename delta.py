@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from atomic import atomic_open
+from links import classify_line
+
+# ===================== تنظیمات =====================
+STATE_PATH = os.path.join(".cache", "delta_state.json")
+STATE_VERSION = 2          # با هر تغییر در کلید حذف تکراری (links.py) بالا می‌رود تا memo قدیمی دور ریخته شود
+
+Classified = Tuple[str, Optional[Tuple[str, int]]]   # (کلید حذف تکراری، host:port یا None)
+
+# ===================== حالت اجرای قبلی =====================
+# بین دو اجرای ساعتی بیشتر خطوط منابع عوض نمی‌شوند. برای هر خط نتیجه‌ی پارس
+# (کلید حذف تکراری و host:port) نگه داشته می‌شود؛ خطوط بدون تغییر دوباره
+# unquote/base64/پارس نمی‌شوند و فقط خطوط جدید از مسیر کامل رد می‌شوند. فهرست خطوط هر منبع هم
+# نگه داشته می‌شود تا خطوط منبعی که یک بار دانلود نشد با آن پاک نشوند.
+# نتیجه‌ی تست خطوط بدون تغییر از کش تست (cache.py) می‌آید که انقضایش پخش شده است.
+
+def digest(data: str) -> str:
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+def line_key(key: object) -> str:
+    # کلید معنایی (tuple از LinkRecord یا خود خط) به شکل قابل ذخیره در JSON
+    return digest(repr(key))
+
+class DeltaState:
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self.lines: Dict[str, list] = {}
+        self.seen: Dict[str, list] = {}
+        self.sources: Dict[str, List[str]] = {}        # منبع → hash خطوطش در اجرای قبل
+        self.sources_seen: Dict[str, List[str]] = {}
+        self.missing: List[str] = []                   # منابعی که در این اجرا دانلود نشدند
+        self.current: Optional[List[str]] = None
+        self.stats = {"lines_added": 0, "lines_reused": 0}
+
+    def load(self) -> "DeltaState":
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.lines = data.get("lines", {})
+                self.sources = data.get("sources", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[⚠️] Cannot read delta state {self.path}: {e}")
+        return self
+
+    def save(self, prune: bool = True):
+        # فقط خطوطی که در این اجرا دیده شدند می‌مانند؛ خطوط حذف‌شده از منابع همین‌جا پاک می‌شوند.
+        # خطوط منبعی که دانلود نشد می‌مانند؛ اگر مرحله‌ی ۱ کامل نشد (prune=False) هیچ خطی پاک نمی‌شود
+        lines = dict(self.seen)
+        sources = dict(self.sources_seen)
+        for url in self.missing if prune else set(self.sources) - set(self.sources_seen):
+            hashes = sources[url] = self.sources.get(url, [])
+            lines.update((h, self.lines[h]) for h in hashes if h in self.lines and h not in lines)
+        if not prune:
+            lines = {**self.lines, **lines}
+        removed = len(set(self.lines) - set(lines))
+        try:
+            with atomic_open(self.path) as f:
+                json.dump({"version": STATE_VERSION, "sources": sources, "lines": lines}, f, separators=(",", ":"))
+        except Exception as e:
+            print(f"[⚠️] Cannot write delta state {self.path}: {e}")
+        s = self.stats
+        print(f"[ℹ️] Delta: {s['lines_reused']} lines reused, {s['lines_added']} added, {removed} removed")
+
+    def source(self, url: str, body: Optional[bytes]):
+        # خطوطی که بعد از این با classify دیده می‌شوند به این منبع تعلق دارند
+        if body is None:
+            self.missing.append(url)
+            self.current = None
+        else:
+            self.current = self.sources_seen[url] = []
+
+    def classify(self, line: str) -> Optional[Classified]:
+        h = digest(line)
+        if self.current is not None:
+            self.current.append(h)
+        entry = self.seen.get(h)
+        if entry is None:
+            entry = self.lines.get(h)
+            if entry is None:
+                item = classify_line(line)
+                if item is None:
+                    entry = []
+                else:
+                    key, rec = item
+                    entry = [line_key(key), rec.host, rec.port] if rec else [line_key(key)]
+                self.stats["lines_added"] += 1
+            else:
+                self.stats["lines_reused"] += 1
+            self.seen[h] = entry
+        if not entry:
+            return None
+        return entry[0], (entry[1], entry[2]) if len(entry) == 3 else None
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import os
+from contextlib import ExitStack
+from typing import IO, Dict, Iterable, List, Optional, Tuple
+
+from atomic import atomic_open
+from links import CONFIG_SCHEMES, SCHEME_ALIASES, LinkRecord, parse_link
+
+# ===================== تنظیمات =====================
+UNKNOWN_COUNTRY = "XX"     # کانفیگ‌هایی که پرچم کشور در remark ندارند
+B64_CHUNK = 3 * 4096       # base64 به صورت جریانی در تکه‌های مضرب ۳ بایت نوشته می‌شود
+
+# transportهایی که هر کلاینت می‌شناسد (بقیه در آن خروجی رد می‌شوند)
+CLASH_NETWORKS = {"tcp", "ws", "grpc", "h2", "http", "httpupgrade"}
+SINGBOX_NETWORKS = {"tcp", "ws", "grpc", "http", "h2", "httpupgrade", "quic"}
+
+# ===================== خروجی‌های اشتراک =====================
+# همه‌ی فرمت‌ها در یک گذر روی خطوط final و از روی LinkRecord ساخته می‌شوند (parse_link کش دارد،
+# پس خطوط همین اجرا دوباره پارس نمی‌شوند). کلید "exports" در پروفایل:
+#   "base64": اشتراک base64 همان خطوط        "clash": proxies برای Clash/Mihomo (YAML)
+#   "singbox": outboundهای sing-box (JSON)     "by_protocol"/"by_country": الگوی مسیر با {protocol}/{country}
+# YAML به صورت flow (هر proxy یک سطر JSON) نوشته می‌شود که YAML معتبر است و به PyYAML نیاز ندارد.
+
+def country_of(remark: str) -> str:
+    # پرچم کشور در remark: دو کاراکتر Regional Indicator پشت سر هم (🇩🇪 → DE)
+    prev = None
+    for ch in remark:
+        code = ord(ch)
+        if 0x1F1E6 <= code <= 0x1F1FF:
+            if prev is not None:
+                return chr(prev - 0x1F1E6 + 65) + chr(code - 0x1F1E6 + 65)
+            prev = code
+        else:
+            prev = None
+    return UNKNOWN_COUNTRY
+
+def _userpass(credential: str) -> Tuple[str, str]:
+    user, _, password = credential.partition(":")
+    return user, password
+
+def _alter_id(params: Dict[str, str]) -> int:
+    try:
+        return int(params.get("aid", 0) or 0)
+    except ValueError:
+        return 0
+
+def _tls_params(rec: LinkRecord, params: Dict[str, str]) -> Optional[Dict[str, object]]:
+    # None = بدون TLS
+    default = "tls" if rec.scheme in ("trojan", "hysteria2") else "none"
+    security = params.get("security", default)
+    if rec.scheme == "hysteria2":
+        security = "tls"
+    if security not in ("tls", "reality", "xtls"):
+        return None
+    host_header = params.get("host", "").split(",")[0]
+    return {
+        "sni": params.get("sni") or params.get("peer") or host_header,
+        "insecure": params.get("allowinsecure", params.get("insecure", "0")) in ("1", "true"),
+        "alpn": [a for a in params.get("alpn", "").split(",") if a],
+        "fp": params.get("fp", ""),
+        "reality": security == "reality",
+        "pbk": params.get("pbk", ""),
+        "sid": params.get("sid", ""),
+    }
+
+def _transport(params: Dict[str, str]) -> Tuple[str, str, str, str]:
+    # (network، path، host header، نام سرویس grpc)
+    network = params.get("type", "tcp")
+    if network == "tcp" and params.get("headertype") == "http":
+        network = "http"
+    return (network, params.get("path", "") or "/", params.get("host", "").split(",")[0],
+            params.get("servicename") or params.get("path", "").strip("/"))
+
+def clash_proxy(rec: LinkRecord, name: str) -> Optional[Dict[str, object]]:
+    params = dict(rec.params)
+    proxy: Dict[str, object] = {"name": name, "server": rec.host, "port": rec.port}
+    if rec.scheme == "ss":
+        if "plugin" in params or ":" not in rec.credential:
+            return None
+        cipher, password = _userpass(rec.credential)
+        proxy.update(type="ss", cipher=cipher, password=password, udp=True)
+        return proxy
+    if rec.scheme == "hysteria2":
+        tls = _tls_params(rec, params)
+        proxy.update(type="hysteria2", password=rec.credential, sni=tls["sni"],
+                     **{"skip-cert-verify": tls["insecure"]})
+        if tls["alpn"]:
+            proxy["alpn"] = tls["alpn"]
+        if params.get("obfs"):
+            proxy.update(obfs=params["obfs"], **{"obfs-password": params.get("obfs-password", "")})
+        return proxy
+    if rec.scheme in ("socks", "ssh"):
+        user, password = _userpass(rec.credential)
+        proxy.update(type="socks5" if rec.scheme == "socks" else "ssh", username=user, password=password)
+        return proxy
+    if rec.scheme not in ("vmess", "vless", "trojan"):
+        return None
+
+    network, path, host_header, service = _transport(params)
+    if network not in CLASH_NETWORKS:
+        return None
+    tls = _tls_params(rec, params)
+    if rec.scheme == "vmess":
+        proxy.update(type="vmess", uuid=rec.credential, alterId=_alter_id(params),
+                     cipher=params.get("cipher", "auto"), tls=tls is not None)
+    elif rec.scheme == "vless":
+        proxy.update(type="vless", uuid=rec.credential, tls=tls is not None)
+        if params.get("flow"):
+            proxy["flow"] = params["flow"]
+    else:
+        proxy.update(type="trojan", password=rec.credential)
+    proxy["udp"] = True
+    if tls is not None:
+        proxy["sni" if rec.scheme == "trojan" else "servername"] = tls["sni"]
+        proxy["skip-cert-verify"] = tls["insecure"]
+        if tls["alpn"]:
+            proxy["alpn"] = tls["alpn"]
+        if tls["fp"]:
+            proxy["client-fingerprint"] = tls["fp"]
+        if tls["reality"]:
+            proxy["reality-opts"] = {"public-key": tls["pbk"], "short-id": tls["sid"]}
+    if network in ("ws", "httpupgrade"):
+        opts: Dict[str, object] = {"path": path}
+        if host_header:
+            opts["headers"] = {"Host": host_header}
+        if network == "httpupgrade":
+            opts["v2ray-http-upgrade"] = True
+        proxy.update(network="ws", **{"ws-opts": opts})
+    elif network == "grpc":
+        proxy.update(network="grpc", **{"grpc-opts": {"grpc-service-name": service}})
+    elif network == "h2":
+        proxy.update(network="h2", **{"h2-opts": {"path": path, "host": [host_header] if host_header else []}})
+    elif network == "http":
+        proxy.update(network="http", **{"http-opts": {"path": [path],
+                                                      "headers": {"Host": [host_header]} if host_header else {}}})
+    return proxy
+
+def singbox_outbound(rec: LinkRecord, tag: str) -> Optional[Dict[str, object]]:
+    params = dict(rec.params)
+    out: Dict[str, object] = {"tag": tag, "server": rec.host, "server_port": rec.port}
+    if rec.scheme == "ss":
+        if "plugin" in params or ":" not in rec.credential:
+            return None
+        method, password = _userpass(rec.credential)
+        out.update(type="shadowsocks", method=method, password=password)
+        return out
+    if rec.scheme in ("socks", "ssh"):
+        user, password = _userpass(rec.credential)
+        if rec.scheme == "socks":
+            out.update(type="socks", version="5", username=user, password=password)
+        else:
+            out.update(type="ssh", user=user, password=password)
+        return out
+    if rec.scheme not in ("vmess", "vless", "trojan", "hysteria2"):
+        return None
+
+    network, path, host_header, service = _transport(params)
+    if rec.scheme != "hysteria2" and network not in SINGBOX_NETWORKS:
+        return None
+    if rec.scheme == "vmess":
+        out.update(type="vmess", uuid=rec.credential, security=params.get("cipher", "auto"),
+                   alter_id=_alter_id(params))
+    elif rec.scheme == "vless":
+        out.update(type="vless", uuid=rec.credential)
+        if params.get("flow"):
+            out["flow"] = params["flow"]
+    elif rec.scheme == "trojan":
+        out.update(type="trojan", password=rec.credential)
+    else:
+        out.update(type="hysteria2", password=rec.credential)
+        if params.get("obfs"):
+            out["obfs"] = {"type": params["obfs"], "password": params.get("obfs-password", "")}
+    tls = _tls_params(rec, params)
+    if tls is not None:
+        tls_out: Dict[str, object] = {"enabled": True, "server_name": tls["sni"], "insecure": tls["insecure"]}
+        if tls["alpn"]:
+            tls_out["alpn"] = tls["alpn"]
+        if tls["fp"]:
+            tls_out["utls"] = {"enabled": True, "fingerprint": tls["fp"]}
+        if tls["reality"]:
+            tls_out["reality"] = {"enabled": True, "public_key": tls["pbk"], "short_id": tls["sid"]}
+        out["tls"] = tls_out
+    if rec.scheme == "hysteria2" or network == "tcp":
+        return out
+    if network in ("ws", "httpupgrade"):
+        transport: Dict[str, object] = {"type": network, "path": path}
+        if host_header and network == "ws":
+            transport["headers"] = {"Host": host_header}
+        elif host_header:
+            transport["host"] = host_header
+    elif network == "grpc":
+        transport = {"type": "grpc", "service_name": service}
+    elif network in ("http", "h2"):
+        transport = {"type": "http", "path": path, "host": [host_header] if host_header else []}
+    else:
+        transport = {"type": network}
+    out["transport"] = transport
+    return out
+
+# ===================== نویسنده‌ها =====================
+
+class Base64Writer:
+    def __init__(self, f: IO):
+        self.f = f
+        self.buffer = bytearray()
+        self.count = 0
+
+    def write(self, line: str, rec: Optional[LinkRecord], name: str):
+        self.buffer += (("\n" if self.count else "") + line).encode("utf-8")
+        self.count += 1
+        if len(self.buffer) >= B64_CHUNK:
+            cut = len(self.buffer) - len(self.buffer) % 3
+            self.f.write(base64.b64encode(bytes(self.buffer[:cut])).decode("ascii"))
+            del self.buffer[:cut]
+
+    def close(self):
+        self.f.write(base64.b64encode(bytes(self.buffer)).decode("ascii"))
+
+class ClashWriter:
+    def __init__(self, f: IO):
+        self.f = f
+        self.count = 0
+        f.write("proxies:\n")
+
+    def write(self, line: str, rec: Optional[LinkRecord], name: str):
+        proxy = clash_proxy(rec, name) if rec else None
+        if proxy is not None:
+            self.f.write("  - " + json.dumps(proxy, ensure_ascii=False) + "\n")
+            self.count += 1
+
+    def close(self):
+        if not self.count:
+            self.f.write("  []\n")
+
+class SingboxWriter:
+    def __init__(self, f: IO):
+        self.f = f
+        self.count = 0
+        f.write('{"outbounds": [')
+
+    def write(self, line: str, rec: Optional[LinkRecord], name: str):
+        out = singbox_outbound(rec, name) if rec else None
+        if out is not None:
+            self.f.write(("," if self.count else "") + "\n  " + json.dumps(out, ensure_ascii=False))
+            self.count += 1
+
+    def close(self):
+        self.f.write("\n]}\n")
+
+class SplitWriter:
+    # یک فایل برای هر پروتکل یا کشور؛ فایل‌ها با اولین کانفیگ همان گروه باز می‌شوند
+    def __init__(self, pattern: str, field: str, stack: ExitStack):
+        self.pattern = pattern
+        self.field = field
+        self.stack = stack
+        self.files: Dict[str, IO] = {}
+        self.count = 0
+
+    def write(self, line: str, rec: Optional[LinkRecord], name: str):
+        if self.field == "protocol":
+            group = rec.scheme if rec else "other"
+        else:
+            group = country_of(rec.remark) if rec else UNKNOWN_COUNTRY
+        f = self.files.get(group)
+        if f is None:
+            f = self.files[group] = self.stack.enter_context(atomic_open(self.pattern.format(**{self.field: group})))
+        else:
+            f.write("\n")
+        f.write(line)
+        self.count += 1
+
+    def _is_group(self, group: str) -> bool:
+        # فقط نام‌هایی که خود این نویسنده می‌سازد، نه فایل‌های دیگری که با الگو جور درمی‌آیند
+        if self.field == "protocol":
+            return group == "other" or group in CONFIG_SCHEMES or group in SCHEME_ALIASES.values()
+        return len(group) == 2 and group.isascii() and group.isupper()
+
+    def close(self):
+        # فایل گروهی که در این اجرا کانفیگی نداشت حذف می‌شود تا نسخه‌ی کهنه‌اش باقی نماند
+        directory = os.path.dirname(self.pattern) or "."
+        prefix, _, suffix = os.path.basename(self.pattern).partition("{" + self.field + "}")
+        for name in os.listdir(directory):
+            group = name[len(prefix):len(name) - len(suffix)] if suffix else name[len(prefix):]
+            if (name.startswith(prefix) and name.endswith(suffix) and self._is_group(group)
+                    and group not in self.files and os.path.isfile(os.path.join(directory, name))):
+                os.remove(os.path.join(directory, name))
+
+def write_exports(exports: Dict[str, str], lines: Iterable[str]) -> Dict[str, int]:
+    # یک گذر روی خطوط؛ هر خط یک بار به رکورد تبدیل و به همه‌ی فرمت‌ها داده می‌شود
+    if not exports:
+        return {}
+    counts: Dict[str, int] = {}
+    with ExitStack() as stack:
+        writers: List[Tuple[str, object]] = []
+        for kind, cls in (("base64", Base64Writer), ("clash", ClashWriter), ("singbox", SingboxWriter)):
+            if exports.get(kind):
+                writers.append((kind, cls(stack.enter_context(atomic_open(exports[kind])))))
+        for kind, field in (("by_protocol", "protocol"), ("by_country", "country")):
+            if exports.get(kind):
+                directory = os.path.dirname(exports[kind].format(**{field: "_"}))
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                writers.append((kind, SplitWriter(exports[kind], field, stack)))
+        names = set()
+        for line in lines:
+            rec = parse_link(line)
+            # نام یکتا برای proxy/outbound (Clash نام تکراری نمی‌پذیرد)
+            base = (rec.remark.strip() if rec else "") or (f"{rec.scheme}-{rec.host}:{rec.port}" if rec else "config")
+            name, n = base, 1
+            while name in names:
+                n += 1
+                name = f"{base} #{n}"
+            names.add(name)
+            for _, writer in writers:
+                writer.write(line, rec, name)
+        for kind, writer in writers:
+            writer.close()
+            counts[kind] = writer.count
+    return counts
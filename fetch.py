@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from atomic import atomic_open
+from metrics import METRICS
+
+# ===================== تنظیمات =====================
+FETCH_TIMEOUT = 15
+MAX_FETCH_WORKERS = 8
+SOURCE_CACHE_DIR = os.path.join(".cache", "sources")   # نسخه‌ی محلی منابع برای پاسخ 304
+
+# ===================== توابع =====================
+
+def new_session(workers: int = MAX_FETCH_WORKERS) -> requests.Session:
+    # اتصال‌های keep-alive به هر host بین درخواست‌ها دوباره استفاده می‌شوند
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _cache_paths(url: str, cache_dir: str):
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, name + ".json"), os.path.join(cache_dir, name + ".body")
+
+def _read_cached(url: str, cache_dir: str):
+    meta_path, body_path = _cache_paths(url, cache_dir)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return {}, None
+    # بدنه‌ای که با meta خودش نمی‌خواند (مثلاً نسخه‌ی قدیمی‌تر) برای درخواست شرطی استفاده نمی‌شود
+    if meta.get("sha1") and meta["sha1"] != hashlib.sha1(body).hexdigest():
+        return {}, None
+    return meta, body
+
+def _write_cached(url: str, cache_dir: str, resp: requests.Response):
+    meta = {"url": url, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    if not meta["etag"] and not meta["last_modified"]:
+        return
+    meta["sha1"] = hashlib.sha1(resp.content).hexdigest()
+    meta_path, body_path = _cache_paths(url, cache_dir)
+    try:
+        # اول بدنه و بعد meta، هر کدام اتمیک؛ کشته شدن بین دو نوشتن بدنه‌ی ناقص با ETag معتبر نمی‌سازد
+        with atomic_open(body_path, "wb") as f:
+            f.write(resp.content)
+        with atomic_open(meta_path) as f:
+            json.dump(meta, f)
+    except OSError as e:
+        print(f"[⚠️] Cannot cache source {url}: {e}")
+
+def fetch_source(session: requests.Session, url: str, timeout: float = FETCH_TIMEOUT,
+                 cache_dir: Optional[str] = SOURCE_CACHE_DIR) -> Optional[bytes]:
+    headers = {}
+    meta, cached = _read_cached(url, cache_dir) if cache_dir else ({}, None)
+    if cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    start = time.perf_counter()
+    try:
+        r = session.get(url, timeout=timeout, headers=headers)
+        if r.status_code == 304 and cached is not None:
+            METRICS.source(url, time.perf_counter() - start, len(cached), "304")
+            return cached
+        if r.status_code == 200:
+            if cache_dir:
+                _write_cached(url, cache_dir, r)
+            METRICS.source(url, time.perf_counter() - start, len(r.content), "200")
+            return r.content
+        print(f"[⚠️] Cannot fetch {url}: HTTP {r.status_code}")
+        METRICS.source(url, time.perf_counter() - start, 0, f"HTTP {r.status_code}")
+    except Exception as e:
+        print(f"[⚠️] Cannot fetch {url}: {e}")
+        METRICS.source(url, time.perf_counter() - start, 0, type(e).__name__)
+    return None
+
+def iter_sources(urls: List[str], timeout: float = FETCH_TIMEOUT, workers: int = MAX_FETCH_WORKERS,
+                 cache_dir: Optional[str] = SOURCE_CACHE_DIR) -> Iterator[Tuple[str, Optional[bytes]]]:
+    # دانلود هم‌زمان؛ هر منبع به محض آماده شدن (به ترتیب urls) برگردانده می‌شود
+    with new_session(workers) as session, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        bodies = pool.map(lambda url: fetch_source(session, url, timeout, cache_dir), urls)
+        yield from zip(urls, bodies)
+
+def fetch_sources(urls: List[str], timeout: float = FETCH_TIMEOUT, workers: int = MAX_FETCH_WORKERS,
+                  cache_dir: Optional[str] = SOURCE_CACHE_DIR) -> Dict[str, Optional[bytes]]:
+    return dict(iter_sources(urls, timeout, workers, cache_dir))
+
+def body_lines(body: Optional[bytes]) -> Iterator[str]:
+    if not body:
+        return
+    for line in io.StringIO(body.decode("utf-8", errors="replace"), newline=None):
+        line = line.strip()
+        if line:
+            yield line
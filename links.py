@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import re
+import urllib.parse
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# ===================== تنظیمات =====================
+SCHEME_ALIASES = {"hy2": "hysteria2"}
+
+# پارامترهایی که مقدارشان به بزرگی/کوچکی حروف حساس نیست
+CASELESS_PARAMS = {"type", "security", "sni", "host", "fp", "encryption", "headertype", "alpn", "flow", "mode"}
+
+# مقادیر پیش‌فرض که حضور یا عدم حضورشان کانفیگ را عوض نمی‌کند
+DEFAULT_PARAMS = {("type", "tcp"), ("headertype", "none"), ("encryption", "none"), ("aid", "0")}
+
+# security پیش‌فرض هر scheme (بقیه none)؛ فقط مقدار پیش‌فرض همان scheme حذف می‌شود
+DEFAULT_SECURITY = {"trojan": "tls"}
+
+# نام فیلدهای JSON در vmess به نام پارامترهای لینک
+VMESS_FIELDS = {"net": "type", "tls": "security", "type": "headertype", "scy": "cipher"}
+VMESS_SKIP = {"v", "ps", "add", "port", "id"}
+
+PARSE_CACHE_SIZE = 1 << 16   # کش رکوردهای پارس‌شده (هر خط یک بار دیکود می‌شود)
+
+# ===================== رکورد کانفیگ =====================
+
+class LinkRecord(NamedTuple):
+    scheme: str
+    host: str
+    port: int
+    credential: str
+    params: Tuple[Tuple[str, str], ...]
+    remark: str
+
+    def key(self) -> tuple:
+        # کلید یکتا: همه چیز به جز remark
+        return self[:5]
+
+def split_host_port(hostport: str) -> Tuple[str, int]:
+    if hostport.startswith("["):
+        host, _, rest = hostport[1:].partition("]")
+        port = rest.lstrip(":")
+    else:
+        host, _, port = hostport.rpartition(":")
+    return host.rstrip(".").lower(), int(port)
+
+def normalize_params(pairs: Iterable[Tuple[str, object]], scheme: str = "") -> Tuple[Tuple[str, str], ...]:
+    params = {}
+    security = DEFAULT_SECURITY.get(scheme, "none")
+    for k, v in pairs:
+        k = str(k).strip().lower()
+        v = str(v).strip() if v is not None else ""
+        if k in CASELESS_PARAMS:
+            v = v.lower()
+        if v and (k, v) not in DEFAULT_PARAMS and (k, v) != ("security", security):
+            params[k] = v
+    return tuple(sorted(params.items()))
+
+def b64decode(data: str) -> str:
+    # هم base64 معمولی و هم urlsafe، با یا بدون padding
+    data = data.strip().replace("-", "+").replace("_", "/")
+    data += "=" * (-len(data) % 4)
+    return base64.b64decode(data, validate=True).decode("utf-8")
+
+def _parse_vmess(body: str) -> Optional[LinkRecord]:
+    # vmess://base64(JSON)
+    data = json.loads(b64decode(body.partition("#")[0]))
+    host = str(data.get("add", "")).strip().strip("[]").rstrip(".").lower()
+    port = int(data.get("port", 0))
+    if not host or not 0 < port < 65536:
+        return None
+    pairs = [(VMESS_FIELDS.get(k, k), v) for k, v in data.items() if k not in VMESS_SKIP]
+    return LinkRecord("vmess", host, port, str(data.get("id", "")), normalize_params(pairs, "vmess"), str(data.get("ps", "")))
+
+def _ss_credential(userinfo: str) -> str:
+    # SIP002: base64(method:password) یا method:password ساده
+    userinfo = urllib.parse.unquote(userinfo)
+    if ":" not in userinfo:
+        try:
+            userinfo = b64decode(userinfo)
+        except (ValueError, UnicodeDecodeError):
+            pass
+    return userinfo
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_link(line: str) -> Optional[LinkRecord]:
+    try:
+        line = line.strip()
+        scheme, sep, body = line.partition("://")
+        if not sep:
+            return None
+        scheme = scheme.lower()
+        scheme = SCHEME_ALIASES.get(scheme, scheme)
+        if scheme == "vmess":
+            return _parse_vmess(body)
+
+        body, _, remark = body.partition("#")
+        authority, _, query = body.partition("?")
+        if scheme == "ss" and "@" not in authority:
+            # فرم قدیمی: ss://base64(method:password@host:port)
+            authority = b64decode(authority.split("/", 1)[0])
+        userinfo, _, hostport = authority.rpartition("@")
+        hostport = hostport.split("/", 1)[0]
+
+        host, port = split_host_port(hostport)
+        if not host or not 0 < port < 65536:
+            return None
+        credential = _ss_credential(userinfo) if scheme == "ss" else urllib.parse.unquote(userinfo)
+        return LinkRecord(
+            scheme=scheme,
+            host=host,
+            port=port,
+            credential=credential,
+            params=normalize_params(urllib.parse.parse_qsl(query), scheme),
+            remark=urllib.parse.unquote(remark),
+        )
+    except (ValueError, AttributeError, TypeError, UnicodeDecodeError):
+        return None
+
+# ===================== فیلتر و حذف تکراری خطوط =====================
+
+CONFIG_SCHEMES = ("ssh", "vmess", "vless", "trojan", "hy2", "hysteria2", "ss", "socks", "wireguard")
+
+# یک dispatch برای همه‌ی schemeها و فیلتر pin، هر دو از پیش کامپایل‌شده (روی str و روی bytes خام)
+_SCHEMES = "|".join(sorted(CONFIG_SCHEMES, key=len, reverse=True))
+_SCHEME_RE = re.compile(rf"(?:{_SCHEMES})://")
+_PIN_RE = re.compile(r"pin=(?:0|red|قرمز)", re.IGNORECASE)
+_PIN = _PIN_RE.pattern.encode("utf-8")
+# خط نامزد در متن خام منبع: scheme (یا scheme با ':' کدشده) و بدون توکن pin در همان خط
+# فاصله‌های ابتدای خط همان‌هایی هستند که str.strip حذف می‌کند (به جز شکست خط)، به شکل UTF-8
+_BLANK = b"(?:%s)*+" % b"|".join(re.escape(chr(c).encode("utf-8")) for c in range(0x3000 + 1)
+                                 if chr(c).isspace() and chr(c) not in "\r\n")
+_CANDIDATE_RE = re.compile(rb"^%s((?:%s)(?::|%%3[aA])(?![^\n]*(?i:%s))[^\n]*)"
+                           % (_BLANK, _SCHEMES.encode(), _PIN), re.MULTILINE)
+_NONEMPTY_RE = re.compile(rb"^%s[^\n]" % _BLANK, re.MULTILINE)
+
+def is_valid_config(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) < 5:
+        return False
+    return _PIN_RE.search(line) is None
+
+def _scheme_ok(line: str) -> bool:
+    # فقط ابتدای خط در صورت نیاز unquote می‌شود، نه کل خط و fragment آن
+    return bool(_SCHEME_RE.match(line) or ("%" in line[:24] and _SCHEME_RE.match(urllib.parse.unquote(line[:32]))))
+
+def parse_config_line(line: str):
+    line = line.strip()
+    if _scheme_ok(line):
+        return urllib.parse.unquote(line)
+    return None
+
+def classify_line(line: str) -> Optional[Tuple[object, Optional[LinkRecord]]]:
+    # (کلید حذف تکراری، رکورد) یا None برای خطی که کانفیگ معتبر نیست
+    line = line.strip()
+    if len(line) < 5 or not _scheme_ok(line) or _PIN_RE.search(line):
+        return None
+    # حذف تکراری‌های معنایی (remark، ترتیب پارامترها و encoding مهم نیست)
+    rec = parse_link(line)
+    if rec:
+        return rec.key(), rec
+    # فقط وقتی خط خام پارس نشد کل آن unquote می‌شود
+    cfg = urllib.parse.unquote(line)
+    rec = parse_link(cfg)
+    return (rec.key() if rec else cfg), rec
+
+def scan_body(body: Optional[bytes]) -> Tuple[int, List[str]]:
+    # پردازش دسته‌ای کل منبع روی bytes خام: (تعداد خطوط غیرخالی، خطوط نامزد).
+    # خطوط بدون scheme یا دارای pin قبل از decode و بدون حلقه‌ی پایتونی کنار گذاشته می‌شوند
+    if not body:
+        return 0, []
+    if b"\r" in body:
+        body = body.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    total = len(_NONEMPTY_RE.findall(body))
+    lines = [raw.decode("utf-8", errors="replace").strip() for raw in _CANDIDATE_RE.findall(body)]
+    return total, lines
+
+def iter_configs(lines: Iterable[str], precise_test=False) -> Iterator[Tuple[str, Optional[LinkRecord]]]:
+    seen = set()
+
+    for line in lines:
+        item = classify_line(line)
+        if item is None:
+            continue
+        key, rec = item
+        if precise_test and not rec:
+            # بدون host:port قابل تست نیست (مثلاً vmess خراب) → وارد خروجی نهایی نمی‌شود
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        yield line, rec
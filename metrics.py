@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from atomic import atomic_open
+
+# ===================== تنظیمات =====================
+LATENCY_BUCKETS = (50, 100, 200, 300, 500, 1000, 2000)   # مرز بالای هر ستون هیستوگرام (ms)
+
+# ===================== گزارش اجرا =====================
+# زمان هر مرحله، زمان و حجم دانلود هر منبع، هیستوگرام latency و تعداد موفق/timeout/refused
+# برای هر پروتکل؛ در پایان اجرا به صورت JSON کنار خروجی‌ها نوشته می‌شود.
+
+def failure_reason(exc: BaseException) -> str:
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, OSError):
+        return "unreachable"
+    return "error"
+
+def latency_bucket(latency: float) -> str:
+    for limit in LATENCY_BUCKETS:
+        if latency <= limit:
+            return f"<={limit}"
+    return f">{LATENCY_BUCKETS[-1]}"
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.stages: Dict[str, float] = {}
+        self.timers: Dict[str, float] = {}
+        self.sources: List[Dict] = []
+        self.failures: Dict[Tuple[str, int], str] = {}
+        self.protocols: Dict[str, Dict[str, int]] = {}
+        self.histograms: Dict[str, Dict[str, int]] = {}
+        self.extra: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0.0) + time.perf_counter() - start, 3)
+
+    def add_time(self, name: str, seconds: float):
+        # زمان تجمعی کارهای ریز و پراکنده (مثلاً پارس خطوط در میان دانلود و تست)
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        # زمان صرف‌شده در خود iterator (نه در مصرف‌کننده‌ی آن) جمع زده می‌شود
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def source(self, url: str, seconds: float, size: int, status: str):
+        with self.lock:
+            self.sources.append({"url": url, "seconds": round(seconds, 3), "bytes": size, "status": status})
+
+    def failure(self, host: str, port: int, reason: str):
+        self.failures[(host, port)] = reason
+
+    def probe(self, protocol: str, latency: Optional[float], reason: Optional[str] = None):
+        counts = self.protocols.setdefault(protocol, {})
+        outcome = "success" if latency is not None else (reason or "error")
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if latency is not None:
+            hist = self.histograms.setdefault(protocol, {})
+            bucket = latency_bucket(latency)
+            hist[bucket] = hist.get(bucket, 0) + 1
+
+    def report(self) -> Dict:
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "duration": round(time.time() - self.started, 3),
+            "stages": self.stages,
+            "timers": {k: round(v, 3) for k, v in self.timers.items()},
+            "sources": self.sources,
+            "probes": self.protocols,
+            "latency_histogram": {p: {b: h[b] for b in map(latency_bucket, (*LATENCY_BUCKETS, float("inf")))
+                                      if b in h} for p, h in self.histograms.items()},
+            **self.extra,
+        }
+
+    def write(self, path: str):
+        try:
+            with atomic_open(path) as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            print(f"[ℹ️] Run report written to {path}")
+        except Exception as e:
+            print(f"[⚠️] Cannot write run report {path}: {e}")
+
+METRICS = Metrics()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextvars
+import ipaddress
+import threading
+import time
+from collections import deque
+from itertools import islice
+import statistics
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+from cache import ProbeCache
+from metrics import METRICS, failure_reason
+from resolver import RESOLVER, is_ip
+
+# ===================== تنظیمات =====================
+MAX_CONCURRENCY = 200      # حداکثر اتصال هم‌زمان
+PROBE_TIMEOUT = 3.0        # مهلت هر تست
+RUN_DEADLINE = 240.0       # مهلت پیش‌فرض کل اجرا (ثانیه از شروع پروسه)؛ در profiles.json یا با --deadline عوض می‌شود
+
+PROBE_SAMPLES = 3          # تعداد اتصال برای هر اندپوینت سالم (میانه و jitter)
+FEED_CHUNK = 256           # تعداد jobهایی که هر بار از ورودی جریانی خوانده می‌شود
+
+ADAPT_PERCENTILE = 0.99    # مهلت تطبیقی: این صدک از زمان اتصال‌های موفق همین اجرا ...
+ADAPT_FACTOR = 1.5         # ... ضربدر این ضریب، بین ADAPT_MIN_TIMEOUT و PROBE_TIMEOUT
+ADAPT_MIN_TIMEOUT = 0.8    # کف مهلت تطبیقی (ثانیه)
+ADAPT_MIN_SAMPLES = 30     # تا این تعداد اتصال موفق همان مهلت ثابت استفاده می‌شود
+ADAPT_WINDOW = 2000        # تعداد آخرین اتصال‌های موفق که صدک از روی آن‌ها حساب می‌شود
+SUBNET_ABORT = 3           # بعد از این تعداد timeout در یک /24 (یا /48) بدون هیچ اتصال موفق، بقیه‌ی آن تست نمی‌شوند
+SEED_CHUNK = 64            # تعداد resolve هم‌زمان نام‌های سالمِ کش برای اتصال‌های موفق subnetها
+
+RUN_START = time.monotonic()
+
+class ProbeResult(NamedTuple):
+    latency: float         # میانه‌ی زمان اتصال (ms)
+    jitter: float          # انحراف معیار زمان اتصال (ms)
+    loss: float            # نسبت نمونه‌های ناموفق
+
+    def score(self) -> float:
+        # کمتر = بهتر؛ jitter و از دست رفتن نمونه‌ها جریمه می‌شوند
+        return self.latency + 2 * self.jitter + self.loss * PROBE_TIMEOUT * 1000
+
+ResultCallback = Callable[[Hashable, Optional[ProbeResult]], None]
+
+# (ip, port) -> تست در جریان/تمام‌شده، برای هر اجرای موتور جدا
+_ip_probes: contextvars.ContextVar = contextvars.ContextVar("ip_probes")
+_probe_guard: contextvars.ContextVar = contextvars.ContextVar("probe_guard")
+T = TypeVar("T")
+
+# ===================== توابع =====================
+
+async def tcp_probe(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> Optional[float]:
+    # زمان اتصال به میلی‌ثانیه، یا None اگر اتصال برقرار نشد
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except Exception as e:
+        METRICS.failure(host, port, failure_reason(e))
+        return None
+    latency = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return latency
+
+# ===================== مهلت تطبیقی و رد کردن subnetهای مرده =====================
+# اندپوینت black-hole تمام مهلت ثابت را می‌سوزاند. وقتی به اندازه‌ی کافی اتصال موفق دیده شد، مهلت
+# به صدک بالای زمان اتصال‌های موفق همین اجرا کم می‌شود. اندپوینت‌های یک /24 معمولاً با هم از دسترس
+# خارج می‌شوند؛ بعد از چند timeout در یک subnet بدون هیچ اتصال موفق، بقیه‌ی آن تست نمی‌شوند.
+# رد شده‌ها و timeoutهایی که با مهلت کوتاه‌شده رخ دادند در کش تست نوشته نمی‌شوند تا اجرای بعد دوباره
+# با مهلت کامل تست شوند (بدون fails اضافه و backoff).
+
+def subnet_of(ip: str) -> str:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = 24 if addr.version == 4 else 48
+    return str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))
+
+class ProbeGuard:
+    def __init__(self, timeout: float = PROBE_TIMEOUT, adaptive: bool = True,
+                 subnet_abort: int = SUBNET_ABORT):
+        self.base = timeout
+        self.adaptive = adaptive
+        self.subnet_abort = subnet_abort
+        self.current = timeout
+        self.latencies: deque = deque(maxlen=ADAPT_WINDOW)
+        self.pending = 0
+        self.subnets: Dict[str, List[int]] = {}      # subnet -> [موفق، timeout]
+        self.aborted: Dict[str, int] = {}            # subnet -> تعداد اندپوینت ردشده
+        self.skipped: Set[Tuple[str, int]] = set()   # (host, port) ردشده
+        self.shortened = 0                           # timeoutهایی که با مهلت کوتاه‌تر از ثابت رخ دادند
+        self.cut: Set[Tuple[str, int]] = set()       # (ip, port) با timeout کوتاه‌شده
+        self.unsure: Set[Tuple[str, int]] = set()    # (host, port) همان‌ها؛ خراب قطعی نیستند و در کش نمی‌روند
+        self.seeds: List[str] = []                   # hostnameهای سالم در کش که هنوز resolve نشده‌اند
+        self.seeding: Optional[asyncio.Future] = None
+
+    def seed(self, host: str):
+        # اندپوینت سالمِ کش هم اتصال موفق subnet خودش حساب می‌شود (تست دوباره نمی‌شود)
+        if not self.subnet_abort:
+            return
+        if is_ip(host):
+            self.subnets.setdefault(subnet_of(host), [0, 0])[0] += 1
+        else:
+            self.seeds.append(host)
+
+    def _open(self, ip: str) -> bool:
+        ok, timeouts = self.subnets.get(subnet_of(ip), (0, 0))
+        return bool(ok) or timeouts < self.subnet_abort
+
+    async def _resolve_seeds(self):
+        while self.seeds:
+            hosts, self.seeds = self.seeds[:SEED_CHUNK], self.seeds[SEED_CHUNK:]
+            for ip in await asyncio.gather(*(RESOLVER.resolve_one(h) for h in hosts)):
+                if ip is not None:
+                    self.subnets.setdefault(subnet_of(ip), [0, 0])[0] += 1
+
+    async def allow(self, ip: str, host: str, port: int) -> bool:
+        if not self.subnet_abort or self._open(ip):
+            return True
+        # قبل از رد کردن subnet، نام‌های سالم کش (فقط همین یک بار و فقط وقتی لازم شد) resolve می‌شوند
+        if self.seeds and (self.seeding is None or self.seeding.done()):
+            self.seeding = asyncio.ensure_future(self._resolve_seeds())
+        if self.seeding is not None:
+            await asyncio.shield(self.seeding)
+            if self._open(ip):
+                return True
+        subnet = subnet_of(ip)
+        self.aborted[subnet] = self.aborted.get(subnet, 0) + 1
+        self.skipped.add((host, port))
+        return False
+
+    def record(self, ip: str, port: int, latency: Optional[float], reason: Optional[str], timeout: float):
+        counts = self.subnets.setdefault(subnet_of(ip), [0, 0])
+        if latency is not None:
+            counts[0] += 1
+            self.latencies.append(latency)
+            self.pending += 1
+            if self.adaptive and len(self.latencies) >= ADAPT_MIN_SAMPLES and self.pending >= 16:
+                self._adapt()
+        elif reason == "timeout":
+            counts[1] += 1
+            if timeout < self.base:
+                self.shortened += 1
+                self.cut.add((ip, port))
+
+    def _adapt(self):
+        self.pending = 0
+        ordered = sorted(self.latencies)
+        high = ordered[min(len(ordered) - 1, int(len(ordered) * ADAPT_PERCENTILE))]
+        self.current = min(self.base, max(ADAPT_MIN_TIMEOUT, high / 1000 * ADAPT_FACTOR))
+
+    def report(self) -> Dict[str, object]:
+        busiest = sorted(self.aborted.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        return {
+            "timeout": round(self.current, 3),
+            "base_timeout": self.base,
+            "shortened_timeouts": self.shortened,
+            "aborted_subnets": len(self.aborted),
+            "skipped_endpoints": len(self.skipped),
+            "top_aborted": dict(busiest),
+        }
+
+async def measure(host: str, port: int, timeout: float = PROBE_TIMEOUT,
+                  samples: int = PROBE_SAMPLES) -> Optional[ProbeResult]:
+    # hostname یک بار (با کش DNS) resolve می‌شود و تست مستقیماً روی IP انجام می‌شود؛
+    # چند hostname که به یک IP می‌رسند فقط یک بار تست می‌شوند
+    ip = await RESOLVER.resolve_one(host)
+    if ip is None:
+        METRICS.failure(host, port, "dns")
+        return None
+    guard = _probe_guard.get(None)
+    if guard is not None and not await guard.allow(ip, host, port):
+        METRICS.failure(host, port, "subnet")
+        return None
+    memo = _ip_probes.get(None)
+    if memo is None:
+        result = await measure_ip(ip, port, timeout, samples)
+    else:
+        task = memo.get((ip, port))
+        if task is None:
+            task = memo[(ip, port)] = asyncio.ensure_future(measure_ip(ip, port, timeout, samples))
+        result = await asyncio.shield(task)
+    if result is None and ip != host:
+        # علت شکست برای گزارش به نام اندپوینت (نه IP) هم ثبت می‌شود
+        METRICS.failure(host, port, METRICS.failures.get((ip, port), "error"))
+    if result is None and guard is not None and (ip, port) in guard.cut:
+        guard.unsure.add((host, port))
+    return result
+
+async def measure_ip(ip: str, port: int, timeout: float = PROBE_TIMEOUT,
+                     samples: int = PROBE_SAMPLES) -> Optional[ProbeResult]:
+    # اگر اتصال اول شکست بخورد اندپوینت خراب است و نمونه‌ی بیشتری گرفته نمی‌شود
+    guard = _probe_guard.get(None)
+    if guard is not None:
+        timeout = min(timeout, guard.current)
+    first = await tcp_probe(ip, port, timeout)
+    if guard is not None:
+        guard.record(ip, port, first, METRICS.failures.get((ip, port)) if first is None else None, timeout)
+    if first is None:
+        return None
+    latencies = [first]
+    failed = 0
+    for _ in range(samples - 1):
+        latency = await tcp_probe(ip, port, timeout)
+        if latency is None:
+            failed += 1
+        else:
+            latencies.append(latency)
+    jitter = statistics.pstdev(latencies) if len(latencies) > 1 else 0.0
+    return ProbeResult(statistics.median(latencies), jitter, failed / max(samples, 1))
+
+def rank(items: Iterable[Tuple[ProbeResult, T]]) -> List[T]:
+    # مرتب‌سازی بر اساس کیفیت اندازه‌گیری‌شده (ترتیب ورودی برای نتایج برابر حفظ می‌شود)
+    return [item for _, item in sorted(items, key=lambda pair: pair[0].score())]
+
+def remaining_time(deadline: Optional[float] = None) -> float:
+    if deadline is None:
+        deadline = RUN_DEADLINE
+    return deadline - (time.monotonic() - RUN_START)
+
+async def _run_probes(jobs: Iterable[tuple], concurrency: int, timeout: float,
+                      deadline: Optional[float], on_result: Callable, probe: Callable,
+                      guard: Optional[ProbeGuard]) -> int:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    done = 0
+    memo: Dict[Tuple[str, int], asyncio.Future] = {}
+    _ip_probes.set(memo)
+    _probe_guard.set(guard)
+
+    async def feeder():
+        # jobs ممکن است یک generator کند باشد (مثلاً دانلود منابع)، پس در thread جدا خوانده می‌شود
+        loop = asyncio.get_running_loop()
+        it = iter(jobs)
+        while True:
+            chunk = await loop.run_in_executor(None, lambda: list(islice(it, FEED_CHUNK)))
+            if not chunk:
+                break
+            for job in chunk:
+                await queue.put(job)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        nonlocal done
+        while True:
+            job = await queue.get()
+            # wait_for ممکن است cancel را قورت دهد (اتمام هم‌زمان اتصال)؛ worker بعد از مهلت خودش هم می‌ایستد
+            if job is None or remaining_time(deadline) <= 0:
+                return
+            key, *args = job
+            result = await probe(*args, timeout=timeout)
+            done += 1
+            on_result(key, result)
+
+    tasks = [asyncio.ensure_future(feeder())]
+    tasks += [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+
+    # با رسیدن به مهلت کل، نتایج تا همین لحظه برگردانده می‌شوند
+    left = max(remaining_time(deadline), 0)
+    _, pending = await asyncio.wait(tasks, timeout=left)
+    if pending:
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        print(f"[⏱️] Run deadline reached: {done} probes finished, rest skipped")
+    if memo:
+        dns_stats = RESOLVER.stats
+        print(f"[ℹ️] DNS: {dns_stats['lookups']} lookups, {dns_stats['hits']} cache hits, "
+              f"{dns_stats['joined']} joined in-flight, {dns_stats['failed']} failed → {len(memo)} unique ip:port probed")
+    return done
+
+def stream_probes(jobs: Iterable[tuple], on_result: Callable,
+                  concurrency: int = MAX_CONCURRENCY, timeout: float = PROBE_TIMEOUT,
+                  deadline: Optional[float] = None, probe: Callable = measure,
+                  guard: Optional[ProbeGuard] = None) -> int:
+    # jobs: (key, *args) — probe(*args, timeout=...) اجرا و on_result(key, result) به محض پایان آن صدا زده می‌شود
+    return asyncio.run(_run_probes(jobs, max(1, concurrency), timeout, deadline, on_result, probe, guard))
+
+def run_probes(jobs: Iterable[Tuple[Hashable, str, int]], concurrency: int = MAX_CONCURRENCY,
+               timeout: float = PROBE_TIMEOUT, deadline: Optional[float] = None) -> Dict[Hashable, Optional[ProbeResult]]:
+    # jobs: (key, host, port) — خروجی: key -> ProbeResult یا None (فقط برای تست‌های تمام‌شده)
+    results: Dict[Hashable, Optional[ProbeResult]] = {}
+    stream_probes(jobs, results.__setitem__, concurrency, timeout, deadline)
+    return results
+
+# ===================== ایندکس اندپوینت‌ها =====================
+
+def canonical_endpoint(host: str, port: int) -> Tuple[str, int]:
+    host = host.strip().strip("[]").rstrip(".").lower()
+    return host, int(port)
+
+def endpoint_stats(index: Dict[Tuple[str, int], List[Hashable]],
+                   probed: Dict[Tuple[str, int], Optional[ProbeResult]]) -> Dict[str, object]:
+    configs = sum(len(keys) for keys in index.values())
+    busiest = sorted(index.items(), key=lambda kv: len(kv[1]), reverse=True)[:5]
+    return {
+        "configs": configs,
+        "endpoints": len(index),
+        "dup_factor": round(configs / len(index), 2) if index else 0.0,
+        "alive": sum(1 for ms in probed.values() if ms is not None),
+        "dead": sum(1 for ms in probed.values() if ms is None),
+        "unprobed": len(index) - len(probed),
+        "busiest": [(f"{h}:{p}", len(keys), probed.get((h, p))) for (h, p), keys in busiest],
+    }
+
+def probe_endpoints(jobs: Iterable[Tuple[Hashable, str, int]], concurrency: int = MAX_CONCURRENCY,
+                    timeout: float = PROBE_TIMEOUT, deadline: Optional[float] = None,
+                    cache: Optional[ProbeCache] = None,
+                    on_result: Optional[ResultCallback] = None, adaptive: bool = True,
+                    subnet_abort: int = SUBNET_ABORT) -> Dict[Hashable, Optional[ProbeResult]]:
+    # هر host:port فقط یک بار تست می‌شود و نتیجه به همه‌ی کانفیگ‌های آن برمی‌گردد.
+    # jobs به صورت جریانی خوانده می‌شود؛ on_result برای هر کانفیگ به محض معلوم شدن نتیجه صدا زده می‌شود
+    if cache is None:
+        cache = ProbeCache().load()
+    index: Dict[Tuple[str, int], List[Hashable]] = {}
+    probed: Dict[Tuple[str, int], Optional[ProbeResult]] = {}
+    results: Dict[Hashable, Optional[ProbeResult]] = {}
+    lock = threading.Lock()
+    hits = 0
+    guard = ProbeGuard(timeout, adaptive, subnet_abort)
+
+    def emit(key, result):
+        results[key] = result
+        if on_result:
+            on_result(key, result)
+
+    def endpoint_jobs():
+        nonlocal hits
+        for key, host, port in jobs:
+            try:
+                ep = canonical_endpoint(host, port)
+            except (TypeError, ValueError):
+                continue
+            with lock:
+                if ep in index:
+                    index[ep].append(key)
+                    if ep in probed:
+                        emit(key, probed[ep])
+                    continue
+                index[ep] = [key]
+                # فقط اندپوینت‌هایی که نتیجه‌ی معتبر در کش ندارند تست می‌شوند
+                entry = cache.get(ep)
+                if entry is not None:
+                    hits += 1
+                    if entry["ok"]:
+                        guard.seed(ep[0])
+                    probed[ep] = ProbeResult(entry["latency"], entry.get("jitter") or 0.0,
+                                             entry.get("loss") or 0.0) if entry["ok"] else None
+                    emit(key, probed[ep])
+                    continue
+            yield ep, ep[0], ep[1]
+
+    def endpoint_done(ep, result):
+        with lock:
+            if ep in guard.skipped:
+                # اندپوینتی که به خاطر subnet مرده تست نشد «تست‌نشده» است، نه خراب: نه در کش می‌رود
+                # و نه به on_result (در run خراب حساب نمی‌شود و در shard نوشته نمی‌شود)
+                return
+            if result is None:
+                # timeout با مهلت کوتاه‌شده هم در کش نمی‌رود (نه fails اضافه و نه backoff)
+                if ep not in guard.unsure:
+                    cache.put(ep, None)
+            else:
+                cache.put(ep, result.latency, result.jitter, result.loss)
+            probed[ep] = result
+            for key in index[ep]:
+                emit(key, result)
+
+    fresh = stream_probes(endpoint_jobs(), endpoint_done, concurrency, timeout, deadline, guard=guard)
+    cache.save()
+    print(f"[ℹ️] Probe cache: {hits} hits, {fresh}/{len(index) - hits} stale endpoints probed")
+    guard_stats = METRICS.extra["probe_guard"] = guard.report()
+    if adaptive or subnet_abort:
+        print(f"[ℹ️] Adaptive timeout: {guard_stats['timeout']}s (base {timeout}s), "
+              f"{guard_stats['shortened_timeouts']} timeouts cut short; "
+              f"subnet abort: {guard_stats['skipped_endpoints']} endpoints skipped in "
+              f"{guard_stats['aborted_subnets']} dead subnets")
+
+    stats = endpoint_stats(index, probed)
+    print(f"[ℹ️] Endpoints: {stats['endpoints']} unique for {stats['configs']} configs "
+          f"(x{stats['dup_factor']}) → alive {stats['alive']}, dead {stats['dead']}, unprobed {stats['unprobed']}")
+    return results
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import dns.asyncresolver   # dnspython — اختیاری؛ فقط برای خواندن TTL واقعی رکوردها
+except ImportError:
+    dns = None
+
+# ===================== تنظیمات =====================
+DEFAULT_TTL = 300          # وقتی TTL واقعی در دسترس نیست (getaddrinfo)
+MIN_TTL = 30
+MAX_TTL = 3600
+NEGATIVE_TTL = 60          # نام‌هایی که resolve نشدند
+DNS_TIMEOUT = 3.0
+
+# ===================== کش DNS =====================
+
+def is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+class Resolver:
+    def __init__(self, timeout: float = DNS_TIMEOUT):
+        self.timeout = timeout
+        self.cache: Dict[str, Tuple[float, Optional[List[str]]]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"lookups": 0, "hits": 0, "negative_hits": 0, "joined": 0, "failed": 0}
+
+    async def _lookup(self, host: str) -> Tuple[Optional[List[str]], float]:
+        if dns is not None:
+            try:
+                answer = await asyncio.wait_for(dns.asyncresolver.resolve(host, "A"), self.timeout)
+                return [r.address for r in answer], answer.rrset.ttl
+            except Exception:
+                pass   # مثلاً فقط AAAA دارد؛ سراغ getaddrinfo می‌رویم
+        loop = asyncio.get_running_loop()
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, None, type=socket.SOCK_STREAM), self.timeout)
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        return addrs, DEFAULT_TTL
+
+    async def resolve(self, host: str) -> Optional[List[str]]:
+        if is_ip(host):
+            return [host]
+        now = time.monotonic()
+        entry = self.cache.get(host)
+        if entry and entry[0] > now:
+            self.stats["hits" if entry[1] else "negative_hits"] += 1
+            return entry[1]
+
+        # اگر همین نام در حال resolve است، منتظر همان درخواست می‌مانیم
+        fut = self.inflight.get(host)
+        if fut is not None and fut.get_loop() is asyncio.get_running_loop():
+            self.stats["joined"] += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self.inflight[host] = fut
+        self.stats["lookups"] += 1
+        try:
+            try:
+                addrs, ttl = await self._lookup(host)
+                ttl = max(MIN_TTL, min(ttl, MAX_TTL))
+            except (OSError, ValueError, asyncio.TimeoutError):
+                addrs, ttl = None, NEGATIVE_TTL
+            if not addrs:
+                addrs, ttl = None, NEGATIVE_TTL
+                self.stats["failed"] += 1
+            self.cache[host] = (time.monotonic() + ttl, addrs)
+            fut.set_result(addrs)
+            return addrs
+        finally:
+            self.inflight.pop(host, None)
+            if not fut.done():
+                fut.cancel()
+
+    async def resolve_one(self, host: str) -> Optional[str]:
+        addrs = await self.resolve(host)
+        return addrs[0] if addrs else None
+
+RESOLVER = Resolver()
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import cProfile
+import itertools
+import json
+import os
+import time
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from atomic import atomic_open
+from cache import ProbeCache
+from delta import DeltaState
+from encoders import write_exports
+from fetch import iter_sources
+from handshake import link_spec, run_handshakes, xray_spec
+from links import classify_line, iter_configs, scan_body
+from metrics import METRICS
+from probe import (MAX_CONCURRENCY, PROBE_TIMEOUT, RUN_DEADLINE, SUBNET_ABORT, ProbeResult, canonical_endpoint,
+                   probe_endpoints, rank)
+from resolver import RESOLVER
+from shard import SHARD_DIR, load_shards, parse_shard, shard_of, shard_path, write_shard
+from snapshot import SNAPSHOT_DIR, SNAPSHOT_KEEP, SnapshotStore
+from xray import (body_chunks, compact_path, config_endpoint, expand_compact, iter_compact, iter_json_array,
+                  json_writer, validate_config)
+
+# ===================== تنظیمات =====================
+PROFILES_PATH = "profiles.json"
+
+# مقادیر پیش‌فرض؛ بخش settings در فایل پروفایل‌ها آن‌ها را عوض می‌کند
+DEFAULT_SETTINGS = {
+    "concurrency": MAX_CONCURRENCY,
+    "probe_timeout": PROBE_TIMEOUT,
+    "run_deadline": RUN_DEADLINE,   # ثانیه از شروع پروسه؛ باید کمتر از timeout ورک‌فلوی اجراکننده باشد
+    "adaptive_timeout": True,     # مهلت تست به صدک بالای زمان اتصال‌های موفق همین اجرا کم می‌شود
+    "subnet_abort": SUBNET_ABORT,   # بعد از چند timeout در یک /24 بدون اتصال موفق، بقیه‌اش تست نمی‌شود (0 = خاموش)
+    "handshake_test": True,   # مرحله‌ی دوم تست: TLS با sni، WebSocket روی path و HTTP/2 برای grpc
+    "delta": True,            # فقط خطوط جدید منابع پارس می‌شوند (delta.py)
+    "checkpoint_interval": 60,   # هر چند ثانیه final با نتایج تا این لحظه منتشر شود (0 = خاموش)
+    "report": "report.json",     # گزارش زمان مراحل، منابع و نتایج تست هر پروتکل ("" = خاموش)
+    "snapshots": SNAPSHOT_KEEP,  # تعداد اجراهایی که بدنه‌ی خام منابعشان برای replay نگه داشته می‌شود (0 = خاموش)
+    "replay_dir": os.path.join(SNAPSHOT_DIR, "replays"),   # خروجی‌های replay در replay_dir/RUN نوشته می‌شوند
+}
+
+# ===================== پروفایل‌ها =====================
+# هر پروفایل یک مجموعه خروجی است (normal/final/top) با فهرست منابع خودش:
+#   kind = "links" → فایل متنی لینک‌ها (مثل cl.py/cl2.py)
+#   kind = "xray"  → آرایه‌ی JSON کانفیگ‌های xray (مثل cl3.py/cl4.py)
+# همه‌ی پروفایل‌ها در یک اجرا پردازش می‌شوند: هر منبع یک بار دانلود و پارس می‌شود،
+# و جدول نتایج تست و ایندکس حذف تکراری بین همه مشترک است.
+
+def load_profiles(path: str = PROFILES_PATH, names: Optional[Iterable[str]] = None) -> Tuple[Dict, List[Dict]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    settings = {**DEFAULT_SETTINGS, **data.get("settings", {})}
+    profiles = data.get("profiles", [])
+    if names:
+        names = list(names)
+        unknown = set(names) - {p["name"] for p in profiles}
+        if unknown:
+            raise ValueError(f"unknown profiles: {', '.join(sorted(unknown))}")
+        profiles = [p for p in profiles if p["name"] in names]
+    return settings, profiles
+
+class LinkOutput:
+    def __init__(self, profile: Dict, stack: ExitStack):
+        self.profile = profile
+        self.header = profile.get("header", "")
+        # فایل به تدریج در normal.tmp نوشته می‌شود و فقط در پایان مرحله‌ی ۱ جای نسخه‌ی قبلی را می‌گیرد
+        self.normal_f = stack.enter_context(atomic_open(profile["normal"]))
+        self.normal_f.write(self.header)
+        self.seen = set()
+        self.members: List[Tuple[int, str]] = []
+        self.normal = 0
+        self.fetched = 0
+        self.previous = self._load_previous()
+
+    def _load_previous(self) -> List[Tuple[str, Tuple[str, int]]]:
+        # final اجرای قبلی؛ تا وقتی اندپوینتش در این اجرا خراب دیده نشده در checkpointها باقی می‌ماند
+        try:
+            with open(self.profile["final"], "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f if line.strip()]
+        except OSError:
+            return []
+        previous = []
+        for line in lines:
+            item = classify(line)
+            if item and item[1]:
+                previous.append((line, item[1]))
+        return previous
+
+    def add(self, line: str, key: object, item_id: Optional[int]):
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        self.normal_f.write(("\n" if self.normal or self.header else "") + line)
+        self.normal += 1
+        if item_id is not None:
+            self.members.append((item_id, line))
+
+    def ranked(self, order: Dict[int, int], items: Dict[int, tuple]) -> List[str]:
+        # هر پروفایل لینک خودش را نگه می‌دارد (remark ممکن است بین منابع فرق کند)
+        alive = sorted((order[i], n, line) for n, (i, line) in enumerate(self.members) if i in order)
+        return [line for _, _, line in alive]
+
+    def write_final(self, final_lines: List[str]):
+        with atomic_open(self.profile["final"]) as f:
+            f.write("\n".join(final_lines))
+
+    def merged(self, order: Dict[int, int], items: Dict[int, tuple], dead: set) -> List[str]:
+        fresh = self.ranked(order, items)
+        kept = set(fresh)
+        return fresh + [line for line, ep in self.previous if ep not in dead and line not in kept]
+
+    def checkpoint(self, order: Dict[int, int], items: Dict[int, tuple], dead: set) -> int:
+        final_lines = self.merged(order, items, dead)
+        self.write_final(final_lines)
+        return len(final_lines)
+
+    def finish(self, final_lines: List[str]) -> Tuple[int, int]:
+        self.write_final(final_lines)
+        top_n = self.profile.get("top_n", 0)
+        if top_n > 0 and self.profile.get("top"):
+            with atomic_open(self.profile["top"]) as f:
+                f.write("\n".join(final_lines[:top_n]))
+        print(f"[✅] {self.profile['name']}: {self.normal} configs → '{self.profile['normal']}', "
+              f"{len(final_lines)} configs → '{self.profile['final']}' ({self.fetched} lines fetched)")
+        # base64، Clash، sing-box و تقسیم بر اساس پروتکل/کشور در یک گذر از روی همان final
+        exported = write_exports(self.profile.get("exports", {}), final_lines)
+        if exported:
+            print(f"[✅] {self.profile['name']} exports: " + ", ".join(f"{k} {n}" for k, n in exported.items()))
+        return self.normal, len(final_lines)
+
+class XrayOutput:
+    def __init__(self, profile: Dict, stack: ExitStack):
+        self.profile = profile
+        self.compact = profile.get("compact", False)
+        self.normal_path = compact_path(profile["normal"]) if self.compact else profile["normal"]
+        self.final_path = compact_path(profile["final"]) if self.compact else profile["final"]
+        f = stack.enter_context(atomic_open(self.normal_path))
+        self.normal = stack.enter_context(json_writer(f, self.compact))
+        self.members: List[int] = []
+        self.untested: List[Dict] = []
+        self.fetched = 0
+        self.previous = self._load_previous()
+
+    def _load_previous(self) -> List[Tuple[Dict, Tuple[str, int]]]:
+        # فایل فشرده فقط فایل کاری محلی است (commit نمی‌شود)؛ اگر نبود همان final کامل خوانده می‌شود
+        try:
+            if self.compact and os.path.exists(self.final_path):
+                with open(self.final_path, "r", encoding="utf-8") as f:
+                    configs = list(iter_compact(f))
+            else:
+                with open(self.profile["final"], "r", encoding="utf-8") as f:
+                    configs = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return []
+        previous = []
+        for cfg in configs:
+            endpoint = config_endpoint(cfg) if isinstance(cfg, dict) else None
+            if endpoint and endpoint[0]:
+                previous.append((cfg, endpoint))
+        return previous
+
+    def add(self, cfg: Dict, item_id: Optional[int], untested: bool):
+        self.normal.write(cfg)
+        if item_id is not None:
+            self.members.append(item_id)
+        elif untested:
+            self.untested.append(cfg)
+
+    def ranked(self, order: Dict[int, int], items: Dict[int, tuple]) -> List[Dict]:
+        # خود کانفیگ فقط در items نگه داشته می‌شود تا خراب‌ها زودتر از حافظه آزاد شوند
+        return [items[i][3] for i in sorted((i for i in self.members if i in order), key=order.get)]
+
+    def write_final(self, configs: List[Dict]) -> List[Dict]:
+        # حذف تکراری با remarks (بهترین نمونه می‌ماند)
+        seen_remarks = set()
+        final_list = []
+        with atomic_open(self.final_path) as f, json_writer(f, self.compact) as final:
+            for cfg in configs:
+                if cfg.get("remarks") not in seen_remarks:
+                    seen_remarks.add(cfg.get("remarks"))
+                    final.write(cfg)
+                    final_list.append(cfg)
+        return final_list
+
+    def merged(self, order: Dict[int, int], items: Dict[int, tuple], dead: set) -> List[Dict]:
+        return self.ranked(order, items) + [cfg for cfg, ep in self.previous if ep not in dead]
+
+    def checkpoint(self, order: Dict[int, int], items: Dict[int, tuple], dead: set) -> int:
+        # final کامل همان فایلی است که منتشر می‌شود؛ در حالت compact هم در هر checkpoint ساخته می‌شود
+        count = len(self.write_final(self.merged(order, items, dead) + self.untested))
+        if self.compact:
+            expand_compact(self.final_path, self.profile["final"])
+        return count
+
+    def finish(self, ranked: List[Dict]) -> Tuple[int, int]:
+        # سریع‌ترین سرورها اول، سپس کانفیگ‌های بدون آدرس
+        final_list = self.write_final(ranked + self.untested)
+        if self.compact:
+            # فایل‌های کامل برای کلاینت‌ها در یک گذر جریانی از روی فایل فشرده ساخته می‌شوند
+            expand_compact(self.final_path, self.profile["final"])
+            expand_compact(self.normal_path, self.profile["normal"])
+
+        top_n = self.profile.get("top_n", 0)
+        if top_n > 0 and self.profile.get("top"):
+            with atomic_open(self.profile["top"]) as f:
+                json.dump(final_list[:top_n], f, ensure_ascii=False, indent=4)
+        print(f"[✅] {self.profile['name']}: {self.normal.count} configs → '{self.profile['normal']}', "
+              f"{len(final_list)} configs → '{self.profile['final']}' ({self.fetched} configs fetched)")
+        return self.normal.count, len(final_list)
+
+OUTPUTS = {"links": LinkOutput, "xray": XrayOutput}
+
+def classify(line: str) -> Optional[Tuple[object, Optional[Tuple[str, int]]]]:
+    item = classify_line(line)
+    if item is None:
+        return None
+    key, rec = item
+    return key, (rec.host, rec.port) if rec else None
+
+def line_spec(line: str):
+    # رکورد کامل فقط برای کانفیگ‌های سالم و فقط در مرحله‌ی handshake ساخته می‌شود
+    return link_spec(classify_line(line)[1])
+
+def replay_profile(profile: Dict, directory: str) -> Dict:
+    # همان پروفایل با همه‌ی مسیرهای خروجی (normal/final/top/exports) داخل directory
+    moved = {k: os.path.join(directory, profile[k]) for k in ("normal", "final", "top") if profile.get(k)}
+    exports = {k: os.path.join(directory, path) for k, path in profile.get("exports", {}).items()}
+    return {**profile, **moved, "exports": exports}
+
+def item_protocol(item: tuple) -> str:
+    _, _, spec_fn, payload = item
+    if spec_fn is line_spec:
+        return payload.partition("://")[0].lower()
+    try:
+        return str(payload["outbounds"][0].get("protocol", "unknown"))
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return "unknown"
+
+# ===================== پارس منابع =====================
+# مرحله‌ی ۱ برای یک منبع؛ run و daemon.py هر دو از همین‌ها استفاده می‌کنند
+
+def parse_links(body: Optional[bytes], classify_fn: Callable = classify) -> Tuple[int, Iterator[tuple]]:
+    # یک پیمایش روی bytes خام منبع؛ فقط خطوط نامزد decode و پارس می‌شوند.
+    # خروجی: (تعداد خطوط، iterator از (خط، کلید حذف تکراری، اندپوینت یا None))
+    start = time.perf_counter()
+    count, candidates = scan_body(body)
+    METRICS.add_time("parse_links", time.perf_counter() - start)
+
+    def parsed() -> Iterator[tuple]:
+        for line in candidates:
+            start = time.perf_counter()
+            item = classify_fn(line)
+            METRICS.add_time("parse_links", time.perf_counter() - start)
+            if item is not None:
+                yield (line, *item)
+
+    return count, parsed()
+
+def parse_xray(url: str, body: Optional[bytes]) -> Iterator[Tuple[Dict, Optional[Tuple[str, int]]]]:
+    # کانفیگ‌های معتبر xray منبع با اندپوینتشان (host خالی = کانفیگ بدون آدرس قابل تست)
+    try:
+        for cfg in METRICS.timed(iter_json_array(body_chunks(body)), "parse_json"):
+            if isinstance(cfg, dict) and validate_config(cfg):
+                yield cfg, config_endpoint(cfg)
+    except ValueError as e:
+        print(f"[⚠️] Cannot parse {url}: {e}")
+
+# ===================== اجرای مشترک =====================
+
+def run(profiles: List[Dict], settings: Optional[Dict] = None, shard: Optional[Tuple[int, int]] = None,
+        merge: int = 0, shard_dir: str = SHARD_DIR, replay: Optional[str] = None):
+    # shard=(K, N): فقط اندپوینت‌های shard شماره‌ی K تست و نتیجه در فایل shard نوشته می‌شود (بدون خروجی)
+    # merge=N: نتایج N فایل shard به جای تست دوباره استفاده و خروجی‌ها ساخته می‌شوند
+    # replay=RUN: منابع به جای دانلود از snapshot اجرای RUN (یا "latest") خوانده می‌شوند؛ خروجی‌ها، گزارش
+    # و کش تست در replay_dir/RUN نوشته می‌شوند و خروجی‌های منتشرشده، حالت delta و کش اصلی دست نمی‌خورند
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    publish = shard is None
+    # id هر کانفیگ قابل تست → (host، port، تابع ساخت spec، ورودی آن)
+    items: Dict[int, Tuple[str, int, Callable, object]] = {}
+    results: Dict[int, ProbeResult] = {}
+    dead = set()   # اندپوینت‌هایی که در این اجرا خراب بودند
+    link_ids: Dict[object, int] = {}   # ایندکس مشترک حذف تکراری لینک‌ها بین پروفایل‌ها
+    next_id = itertools.count()
+    state = DeltaState().load() if settings["delta"] else None
+    classify_fn = state.classify if state is not None else classify
+    shard_probes: Dict[Tuple[str, int], Optional[ProbeResult]] = {}
+    cache = ProbeCache().load()
+    snapshots = SnapshotStore()
+    if replay:
+        replay = snapshots.resolve(replay)
+        snapshots.load(replay)   # snapshot ناموجود همین‌جا خطا می‌دهد، نه وسط دانلود
+        replay_dir = os.path.join(settings["replay_dir"], replay)
+        profiles = [replay_profile(p, replay_dir) for p in profiles]
+        cache.path = os.path.join(replay_dir, os.path.basename(cache.path))
+        if settings["report"]:
+            settings["report"] = os.path.join(replay_dir, settings["report"])
+        print(f"[ℹ️] Replaying snapshot {replay} → outputs in {replay_dir}")
+    known = load_shards(merge, cache, shard_dir) if merge else None
+    record = publish and not replay and settings["snapshots"] > 0
+
+    stage1 = {"complete": False}
+
+    def tested_here(endpoint: Tuple[str, int]) -> bool:
+        return shard is None or shard_of(*endpoint, shard[1]) == shard[0]
+
+    with ExitStack() as stack:
+        outputs = []
+        users: Dict[str, Dict[str, List]] = {}   # منبع → نوع → خروجی‌هایی که از آن استفاده می‌کنند
+        for p in profiles:
+            kind = p.get("kind", "links")
+            out = OUTPUTS[kind](p, stack) if publish else None
+            if out is not None:
+                outputs.append(out)
+            for url in p["sources"]:
+                targets = users.setdefault(url, {}).setdefault(kind, [])
+                if out is not None and out not in targets:
+                    targets.append(out)
+
+        def link_jobs(url: str, body: Optional[bytes], targets: List[LinkOutput]) -> Iterator[tuple]:
+            if state is not None:
+                state.source(url, body)
+            count, parsed = parse_links(body, classify_fn)
+            for line, key, endpoint in parsed:
+                item_id = new = None
+                if endpoint and tested_here(endpoint):
+                    item_id = link_ids.get(key)
+                    if item_id is None:
+                        item_id = new = link_ids[key] = next(next_id)
+                        items[item_id] = (*endpoint, line_spec, line)
+                # هر خط همان لحظه در normal نوشته می‌شود، قبل از اینکه برای تست فرستاده شود
+                for out in targets:
+                    out.add(line, key, item_id)
+                if new is not None:
+                    yield (new, *endpoint)
+            if not count:
+                print(f"[⚠️] Empty or failed to fetch: {url}")
+            for out in targets:
+                out.fetched += count
+
+        def xray_jobs(url: str, body: Optional[bytes], targets: List[XrayOutput]) -> Iterator[tuple]:
+            count = 0
+            for cfg, endpoint in parse_xray(url, body):
+                count += 1
+                item_id = None
+                if endpoint and endpoint[0] and tested_here(endpoint):
+                    item_id = next(next_id)
+                    items[item_id] = (*endpoint, xray_spec, cfg)
+                for out in targets:
+                    out.add(cfg, item_id, untested=bool(endpoint) and not endpoint[0])
+                if item_id is not None:
+                    yield (item_id, *endpoint)
+            for out in targets:
+                out.fetched += count
+
+        def jobs() -> Iterator[tuple]:
+            # هر منبع فقط یک بار دانلود و پارس می‌شود، حتی اگر چند پروفایل از آن استفاده کنند
+            with METRICS.stage("fetch_parse"):
+                sources = snapshots.replay(replay, list(users)) if replay else iter_sources(list(users))
+                for url, body in sources:
+                    if record:
+                        snapshots.record(url, body)
+                    for kind, targets in users[url].items():
+                        yield from (link_jobs if kind == "links" else xray_jobs)(url, body, targets)
+            if record:
+                snapshots.save()
+                snapshots.prune(settings["snapshots"])
+            stage1["complete"] = True
+            print(f"[ℹ️] Stage 1 complete → {len(users)} sources fetched and parsed once for {len(profiles)} profiles")
+
+        def checkpoint():
+            # final معتبر با نتایج تا این لحظه + کانفیگ‌های اجرای قبل که در این اجرا خراب دیده نشده‌اند؛
+            # اگر پروسه وسط مرحله‌ی ۲ کشته شود همین نسخه منتشر می‌شود، نه فایل خالی
+            with METRICS.stage("checkpoints"):
+                order = {i: n for n, i in enumerate(rank((result, i) for i, result in results.items()))}
+                for out in outputs:
+                    try:
+                        out.checkpoint(order, items, dead)
+                    except Exception as e:
+                        print(f"[⚠️] Checkpoint of {out.profile['name']} failed: {e}")
+            print(f"[💾] Checkpoint: {len(results)} alive configs, {len(dead)} dead endpoints dropped")
+
+        last_checkpoint = time.monotonic()
+
+        def on_result(i, result):
+            nonlocal last_checkpoint
+            if not publish:
+                shard_probes[items[i][:2]] = result
+            if result is None:
+                reason = METRICS.failures.get(canonical_endpoint(*items[i][:2]), "cached")
+                METRICS.probe(item_protocol(items[i]), None, reason)
+            else:
+                METRICS.probe(item_protocol(items[i]), result.latency)
+            # کانفیگ‌های خراب همان لحظه از حافظه حذف می‌شوند
+            if result is None:
+                dead.add(items.pop(i)[:2])
+            else:
+                results[i] = result
+            interval = settings["checkpoint_interval"]
+            if publish and interval and time.monotonic() - last_checkpoint >= interval:
+                checkpoint()
+                last_checkpoint = time.monotonic()
+
+        # مرحله ۲: تست TCP مشترک؛ هر host:port در کل اجرا فقط یک بار
+        job_iter = jobs()
+        with METRICS.stage("probe"):
+            probe_endpoints(job_iter, concurrency=settings["concurrency"], timeout=settings["probe_timeout"],
+                            deadline=settings["run_deadline"], cache=cache, on_result=on_result, adaptive=settings["adaptive_timeout"],
+                            subnet_abort=settings["subnet_abort"])
+        # اگر مهلت تست زودتر از مرحله‌ی ۱ تمام شد، بقیه‌ی منابع بدون تست خوانده می‌شوند تا normal
+        # و حالت delta کامل بمانند (نه فقط همان بخشی که تا آن لحظه به تست رسیده بود)
+        skipped = sum(1 for _ in job_iter)
+        if skipped:
+            print(f"[⏱️] Stage 1 finished after the probe deadline: {skipped} configs written without probing")
+        if state is not None and not replay:
+            # خطوط دیده‌نشده فقط وقتی پاک می‌شوند که همه‌ی منابع تا آخر خوانده شده باشند
+            state.save(prune=stage1["complete"])
+        if publish and settings["checkpoint_interval"] and settings["handshake_test"]:
+            checkpoint()
+
+    # سریع‌ترین سرورها اول؛ کلاینت‌هایی که به ترتیب امتحان می‌کنند زودتر وصل می‌شوند
+    ranked = rank((result, i) for i, result in results.items())
+    shard_handshakes = {}
+    if settings["handshake_test"]:
+        # فقط سرورهایی که از تست TCP رد شده‌اند: handshake واقعی TLS/WebSocket/gRPC
+        with METRICS.stage("handshake"):
+            ok = run_handshakes(((i, items[i][0], items[i][1], items[i][2](items[i][3])) for i in ranked),
+                                deadline=settings["run_deadline"], known=known, on_target=None if publish else shard_handshakes.__setitem__)
+        failed = [i for i in ranked if not ok.get(i, True)]
+        METRICS.extra["handshake"] = {"configs": len(ranked), "failed": len(failed)}
+        dead.update(items[i][:2] for i in failed)
+        ranked = [i for i in ranked if ok.get(i, True)]
+    METRICS.extra["dns"] = dict(RESOLVER.stats)
+    METRICS.extra["probe_cache"] = {"hits": cache.hits, "misses": cache.misses}
+
+    if not publish:
+        write_shard(shard_path(*shard, shard_dir), shard_probes, cache, shard_handshakes)
+        if settings["report"]:
+            METRICS.write(os.path.join(shard_dir, f"report-shard-{shard[0]}-of-{shard[1]}.json"))
+        return
+    order = {i: n for n, i in enumerate(ranked)}
+    # اگر مهلت قبل از تست همه‌ی کانفیگ‌ها تمام شد، final مثل checkpoint با کانفیگ‌های اجرای قبل
+    # (منهای خراب‌های این اجرا) ادغام می‌شود؛ فهرست خالص رتبه‌بندی‌شده فقط وقتی همه تست شده‌اند
+    unprobed = len(items) - len(results)
+    if unprobed:
+        print(f"[⏱️] {unprobed} configs were not probed before the deadline; keeping previous final entries not seen dead")
+
+    counts = {}
+    with METRICS.stage("write_outputs"):
+        for out in outputs:
+            try:
+                normal, final = out.finish(out.merged(order, items, dead) if unprobed else out.ranked(order, items))
+                counts[out.profile["name"]] = {"normal": normal, "final": final}
+            except Exception as e:
+                print(f"[❌] Error while saving outputs of {out.profile['name']}: {e}")
+    METRICS.extra["outputs"] = counts
+    if settings["report"]:
+        METRICS.write(settings["report"])
+
+# ===================== API لیستی =====================
+
+def process_links(lines: List[str], precise_test=False, concurrency: int = MAX_CONCURRENCY,
+                  timeout: float = PROBE_TIMEOUT) -> List[str]:
+    candidates = list(iter_configs(lines, precise_test))
+    if not precise_test:
+        return [line for line, _ in candidates]
+
+    # تست TCP هم‌زمان؛ هر host:port فقط یک بار، با همان timeout ثابت (بدون مهلت تطبیقی و رد subnet)
+    probed = probe_endpoints(((i, rec.host, rec.port) for i, (_, rec) in enumerate(candidates)),
+                             concurrency=concurrency, timeout=timeout, adaptive=False, subnet_abort=0)
+    # مرتب بر اساس کیفیت (latency، jitter، از دست رفتن نمونه‌ها)
+    return rank((probed[i], line) for i, (line, _) in enumerate(candidates) if probed.get(i) is not None)
+
+def process_xray(configs: List[Dict], precise_test=False, concurrency: int = MAX_CONCURRENCY,
+                 timeout: float = PROBE_TIMEOUT) -> List[Dict]:
+    candidates = []
+    jobs = []
+
+    for i, cfg in enumerate(configs):
+        endpoint = config_endpoint(cfg)
+        if not endpoint:
+            continue
+        host, port = endpoint
+        candidates.append((i, cfg))
+        if precise_test and host:
+            jobs.append((i, host, port))
+
+    # تست TCP هم‌زمان؛ هر host:port فقط یک بار، با همان timeout ثابت (بدون مهلت تطبیقی و رد subnet)
+    probed = probe_endpoints(jobs, concurrency=concurrency, timeout=timeout,
+                             adaptive=False, subnet_abort=0) if jobs else {}
+    tested = {job[0] for job in jobs}
+    # تست‌شده‌ها مرتب بر اساس کیفیت، سپس کانفیگ‌های بدون آدرس
+    results = rank((probed[i], cfg) for i, cfg in candidates if probed.get(i) is not None)
+    results += [cfg for i, cfg in candidates if i not in tested]
+
+    # حذف تکراری با استفاده از remarks
+    unique = {}
+    for cfg in results:
+        key = cfg.get("remarks")
+        if key not in unique:
+            unique[key] = cfg
+
+    return list(unique.values())
+
+# ========================== اجرا ==========================
+if __name__ == "__main__":
+    # python runner.py                  → همه‌ی پروفایل‌ها
+    # python runner.py cl cl3           → فقط پروفایل‌های نام‌برده
+    # python runner.py --shard 0/4      → فقط تست shard اول از چهار (هر shard در پروسه یا job جدا)
+    # python runner.py --merge 4        → ساخت خروجی‌ها از نتایج چهار shard
+    # python runner.py --replay latest  → اجرای بدون دانلود از آخرین snapshot منابع
+    parser = argparse.ArgumentParser(description="Subscription update runner")
+    parser.add_argument("profiles", nargs="*", help="profile names from profiles.json (default: all)")
+    parser.add_argument("--profiles-file", default=PROFILES_PATH)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--shard", type=parse_shard, metavar="K/N", help="probe only shard K of N")
+    mode.add_argument("--merge", type=int, default=0, metavar="N", help="build outputs from N shard results")
+    parser.add_argument("--shard-dir", default=SHARD_DIR)
+    parser.add_argument("--profile", metavar="PATH", help="write cProfile stats of the run to PATH")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="stop probing SECONDS after start (overrides run_deadline; keep below the job timeout)")
+    parser.add_argument("--replay", metavar="RUN", help="read sources from snapshot RUN ('latest') instead of fetching")
+    parser.add_argument("--list-snapshots", action="store_true", help="list stored source snapshots and exit")
+    args = parser.parse_args()
+
+    if args.list_snapshots:
+        for run_id in SnapshotStore().runs():
+            print(run_id)
+        raise SystemExit(0)
+
+    start_time = time.time()
+    settings, profiles = load_profiles(args.profiles_file, args.profiles)
+    if args.deadline:
+        settings["run_deadline"] = args.deadline
+    print(f"[*] Starting update → profiles: {', '.join(p['name'] for p in profiles)}")
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    run(profiles, settings, shard=args.shard, merge=args.merge, shard_dir=args.shard_dir, replay=args.replay)
+    if profiler:
+        # مشاهده: python -m pstats PATH
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"[ℹ️] cProfile stats written to {args.profile}")
+    print(f"[*] Done. Time elapsed: {time.time() - start_time:.2f}s")
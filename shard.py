@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import time
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+from atomic import atomic_open
+from cache import ProbeCache, _key
+from handshake import HandshakeSpec
+from probe import canonical_endpoint
+
+# ===================== تنظیمات =====================
+SHARD_DIR = os.path.join(".cache", "shards")
+
+HandshakeTarget = Tuple[str, int, HandshakeSpec]
+
+# ===================== تقسیم کار تست بین چند پروسه =====================
+# هر اندپوینت بر اساس hash ثابت host:port دقیقاً به یک shard تعلق دارد. هر shard (پروسه‌ی جدا
+# یا job جدا در matrix ورک‌فلو) منابع را می‌خواند ولی فقط اندپوینت‌های خودش را تست می‌کند و
+# نتیجه را در یک فایل می‌نویسد. مرحله‌ی merge فایل‌ها را در کش تست می‌ریزد و خروجی‌ها را
+# بدون تست دوباره می‌سازد؛ اندپوینت shardی که فایلش نرسیده در خود merge تست می‌شود.
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    # "2/4" → (2, 4)
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"invalid shard {spec!r}: expected K/N with 0 <= K < N")
+    return index, count
+
+def shard_of(host: str, port: int, count: int) -> int:
+    host, port = canonical_endpoint(host, port)
+    return zlib.crc32(f"{host}:{port}".encode("utf-8")) % count
+
+def shard_path(index: int, count: int, directory: str = SHARD_DIR) -> str:
+    return os.path.join(directory, f"shard-{index}-of-{count}.json")
+
+def write_shard(path: str, endpoints: Iterable[Tuple[str, int]], cache: ProbeCache,
+                handshakes: Dict[HandshakeTarget, bool]):
+    # ورودی‌های کش برای اندپوینت‌های این shard همان‌طور که هستند نوشته می‌شوند: نتیجه‌ی کش بدون ts
+    # تازه و نتیجه‌ی تست همین اجرا با fails/backoff پیوسته (probe_endpoints خودش در cache گذاشته)
+    entries = {}
+    for host, port in endpoints:
+        ep = canonical_endpoint(host, port)
+        entry = cache.peek(ep)
+        if entry is not None:
+            entries[_key(ep)] = entry
+    data = {
+        "probes": entries,
+        "handshakes": [[host, port, list(spec[:-1]) + [list(spec.alpn)], ok]
+                       for (host, port, spec), ok in handshakes.items()],
+    }
+    with atomic_open(path) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"[ℹ️] Shard results: {len(entries)} endpoints, {len(handshakes)} handshakes → {path}")
+
+def load_shards(count: int, cache: ProbeCache,
+                directory: str = SHARD_DIR) -> Dict[HandshakeTarget, bool]:
+    # نتایج همه‌ی shardها به کش تست اضافه می‌شوند؛ handshakeها جدا برگردانده می‌شوند
+    handshakes: Dict[HandshakeTarget, bool] = {}
+    missing: List[int] = []
+    now = time.time()
+    for index in range(count):
+        try:
+            with open(shard_path(index, count, directory), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            missing.append(index)
+            continue
+        for key, entry in data.get("probes", {}).items():
+            # نتیجه‌ی همین چرخه است، حتی اگر ساعت ماشین shard کمی جلوتر یا عقب‌تر باشد
+            cache.entries[key] = {**entry, "ts": min(entry.get("ts", now), now)}
+        for host, port, fields, ok in data.get("handshakes", []):
+            handshakes[(host, port, HandshakeSpec(*fields[:-1], tuple(fields[-1])))] = ok
+    if missing:
+        print(f"[⚠️] Missing shard results: {', '.join(map(str, missing))} of {count} → tested here instead")
+    print(f"[ℹ️] Merged {count - len(missing)}/{count} shards: {len(cache.entries)} cached endpoints, "
+          f"{len(handshakes)} handshakes")
+    return handshakes
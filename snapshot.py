@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from atomic import atomic_open
+
+# ===================== تنظیمات =====================
+SNAPSHOT_DIR = os.path.join(".cache", "snapshots")
+SNAPSHOT_KEEP = 24         # تعداد اجراهایی که snapshot آن‌ها نگه داشته می‌شود (۰ = خاموش)
+
+# ===================== snapshot منابع خام =====================
+# بدنه‌ی خام هر منبع دانلودشده فشرده و با hash محتوا (sha256) در objects/ ذخیره می‌شود؛ منبعی
+# که بین دو اجرا تغییر نکرده فقط یک بار نگه داشته می‌شود. برای هر اجرا یک manifest
+# (url → hash) در manifests/ نوشته می‌شود. با replay همان اجرا بدون هیچ دانلودی از همان
+# بایت‌ها دوباره پارس و تست می‌شود (مقایسه‌ی تغییرات پارس/تست). فقط آخرین SNAPSHOT_KEEP
+# اجرا می‌مانند و objectهایی که در هیچ manifest باقی‌مانده‌ای نیستند پاک می‌شوند.
+
+class SnapshotStore:
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.objects = os.path.join(directory, "objects")
+        self.manifests = os.path.join(directory, "manifests")
+        self.sources: Dict[str, Optional[str]] = {}
+        self.stored = 0
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], digest + ".gz")
+
+    def put(self, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            with atomic_open(path, "wb") as f:
+                f.write(gzip.compress(body, compresslevel=6, mtime=0))
+            self.stored += 1
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self._object_path(digest), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def record(self, url: str, body: Optional[bytes]):
+        # منبعی که دانلود نشد با null ثبت می‌شود تا replay همان شکست را ببیند
+        try:
+            self.sources[url] = self.put(body) if body is not None else None
+        except OSError as e:
+            print(f"[⚠️] Cannot snapshot source {url}: {e}")
+
+    def save(self) -> Optional[str]:
+        if not self.sources:
+            return None
+        run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        manifest = {"run": run_id, "sources": self.sources}
+        try:
+            with atomic_open(os.path.join(self.manifests, run_id + ".json")) as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            print(f"[⚠️] Cannot write snapshot manifest: {e}")
+            return None
+        print(f"[💾] Snapshot {run_id}: {len(self.sources)} sources, {self.stored} new objects → {self.directory}")
+        return run_id
+
+    def runs(self) -> List[str]:
+        try:
+            names = os.listdir(self.manifests)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+    def resolve(self, run_id: str) -> str:
+        if run_id != "latest":
+            return run_id
+        runs = self.runs()
+        if not runs:
+            raise ValueError(f"no snapshots in {self.directory}")
+        return runs[-1]
+
+    def load(self, run_id: str = "latest") -> Dict[str, Optional[str]]:
+        run_id = self.resolve(run_id)
+        try:
+            with open(os.path.join(self.manifests, run_id + ".json"), "r", encoding="utf-8") as f:
+                return json.load(f).get("sources", {})
+        except FileNotFoundError:
+            raise ValueError(f"unknown snapshot {run_id!r}; available: {', '.join(self.runs()) or 'none'}")
+
+    def replay(self, run_id: str, urls: List[str]) -> Iterator[Tuple[str, Optional[bytes]]]:
+        # جایگزین iter_sources: همان (url, body) ولی از snapshot، بدون شبکه
+        sources = self.load(run_id)
+        for url in urls:
+            digest = sources.get(url)
+            if url not in sources:
+                print(f"[⚠️] Source not in snapshot {run_id}: {url}")
+            body = None
+            if digest is not None:
+                try:
+                    body = self.get(digest)
+                except (OSError, EOFError, gzip.BadGzipFile) as e:
+                    print(f"[⚠️] Cannot read snapshot of {url}: {e}")
+            yield url, body
+
+    def prune(self, keep: int = SNAPSHOT_KEEP):
+        # manifestهای قدیمی حذف و objectهای بی‌مرجع پاک می‌شوند
+        runs = self.runs()
+        for run_id in runs[:-keep] if keep > 0 else runs:
+            os.remove(os.path.join(self.manifests, run_id + ".json"))
+        referenced = set()
+        for run_id in self.runs():
+            try:
+                referenced.update(d for d in self.load(run_id).values() if d)
+            except (OSError, ValueError) as e:
+                print(f"[⚠️] Cannot read snapshot manifest {run_id}: {e}")
+                return
+        evicted = 0
+        for root, _, names in os.walk(self.objects):
+            for name in names:
+                if name.endswith(".gz") and name[:-3] not in referenced:
+                    os.remove(os.path.join(root, name))
+                    evicted += 1
+        if evicted or len(runs) > keep:
+            print(f"[ℹ️] Snapshots: kept {min(len(runs), keep)} runs, evicted {evicted} unreferenced objects")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import codecs
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from atomic import atomic_open
+
+# ===================== تنظیمات =====================
+CHUNK_SIZE = 64 * 1024
+SHARED_SECTIONS = ("log", "dns", "inbounds", "routing")   # بخش‌هایی که در قالب مشترک می‌روند
+
+_SKIP_RE = re.compile(r"[\s,]*")
+
+# ===================== خواندن جریانی آرایه‌ی JSON =====================
+
+def body_chunks(body: Optional[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # decode تکه‌تکه؛ کل متن هیچ‌وقت یک‌جا در حافظه ساخته نمی‌شود
+    if not body:
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(body)
+    for start in range(0, len(view), chunk_size):
+        yield decoder.decode(view[start:start + chunk_size])
+    yield decoder.decode(b"", final=True)
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[object]:
+    # عناصر یک آرایه‌ی JSON بزرگ را یکی‌یکی برمی‌گرداند
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos = "", 0
+    started = eof = False
+
+    while True:
+        pos = _SKIP_RE.match(buf, pos).end()
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("top-level JSON value is not an array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # عدد یا literal در انتهای بافر ممکن است هنوز ناقص باشد
+                if end < len(buf) or eof:
+                    yield obj
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            if started:
+                raise ValueError("unterminated JSON array")
+            return
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buf, pos = buf[pos:] + chunk, 0
+
+# ===================== فیلدهای لازم برای تست =====================
+
+def config_endpoint(cfg: Dict) -> Optional[Tuple[str, int]]:
+    # آدرس سرور از outbound اول: vnext (vless/vmess) یا servers (trojan/shadowsocks)
+    try:
+        settings = cfg["outbounds"][0]["settings"]
+        server = (settings.get("vnext") or settings.get("servers"))[0]
+        return server.get("address"), int(server.get("port", 443))
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+        return None
+
+def validate_config(cfg: Dict) -> bool:
+    return bool(cfg and "remarks" in cfg and "outbounds" in cfg)
+
+# ===================== نوشتن جریانی آرایه‌ی JSON =====================
+
+class JsonArrayWriter:
+    # خروجی همان json.dump(list, indent=4) است، ولی عنصر به عنصر نوشته می‌شود
+    def __init__(self, f: IO[str], indent: int = 4):
+        self.f = f
+        self.indent = indent
+        self.count = 0
+
+    def write(self, obj: object):
+        text = json.dumps(obj, ensure_ascii=False, indent=self.indent)
+        pad = " " * self.indent
+        self.f.write(("[\n" if not self.count else ",\n") + pad + text.replace("\n", "\n" + pad))
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "[]")
+
+    def __enter__(self) -> "JsonArrayWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ===================== خروجی فشرده با قالب مشترک =====================
+# بخش‌های log/dns/inbounds/routing و outboundهای کمکی (fragment، dns-out) در هزاران کانفیگ
+# تقریباً یکسان‌اند؛ هر قالب یک بار نوشته می‌شود و هر کانفیگ فقط تفاوت خودش را دارد.
+# فرمت: JSON Lines — خط قالب {"template": id, "keys", "shared", "tail"} و خط کانفیگ {"t": id, "c": delta}
+
+def compact_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".compact.jsonl"
+
+def split_template(cfg: Dict) -> Tuple[Dict, Dict]:
+    shared = {k: cfg[k] for k in SHARED_SECTIONS if k in cfg}
+    delta = {k: v for k, v in cfg.items() if k not in shared}
+    outbounds = cfg.get("outbounds")
+    tail = None
+    if isinstance(outbounds, list) and outbounds:
+        tail = outbounds[1:]
+        delta["outbounds"] = outbounds[:1]
+    return {"keys": list(cfg), "shared": shared, "tail": tail}, delta
+
+def join_template(template: Dict, delta: Dict) -> Dict:
+    cfg = {}
+    for k in template["keys"]:
+        cfg[k] = template["shared"][k] if k in template["shared"] else delta[k]
+    if template["tail"] is not None:
+        cfg["outbounds"] = delta["outbounds"] + template["tail"]
+    return cfg
+
+class CompactWriter:
+    def __init__(self, f: IO[str]):
+        self.f = f
+        self.templates = set()
+        self.count = 0
+
+    def write(self, cfg: Dict):
+        template, delta = split_template(cfg)
+        raw = json.dumps(template, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        tid = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+        if tid not in self.templates:
+            self.templates.add(tid)
+            self.f.write(json.dumps({"template": tid, **template}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.f.write(json.dumps({"t": tid, "c": delta}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> "CompactWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def json_writer(f: IO[str], compact: bool = False):
+    return CompactWriter(f) if compact else JsonArrayWriter(f)
+
+def iter_compact(lines: Iterable[str]) -> Iterator[Dict]:
+    templates: Dict[str, Dict] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if "template" in item:
+            templates[item.pop("template")] = item
+        else:
+            yield join_template(templates[item["t"]], item["c"])
+
+def expand_compact(src: str, dst: str) -> int:
+    # تبدیل فایل فشرده به JSON کامل سازگار با کلاینت‌ها، در یک گذر جریانی
+    with open(src, "r", encoding="utf-8") as fin, atomic_open(dst) as fout, \
+            JsonArrayWriter(fout) as out:
+        for cfg in iter_compact(fin):
+            out.write(cfg)
+    return out.count
+
+if __name__ == "__main__":
+    # python xray.py final.compact.jsonl final.json
+    if len(sys.argv) != 3:
+        print("usage: python xray.py <input.compact.jsonl> <output.json>")
+        sys.exit(1)
+    print(f"[ℹ️] {expand_compact(sys.argv[1], sys.argv[2])} configs expanded to {sys.argv[2]}")